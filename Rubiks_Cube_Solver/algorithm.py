@@ -0,0 +1,181 @@
+import math
+from collections import namedtuple
+
+from . import facelets
+from .notation import parse_moves
+
+# pieces: the names of the pieces in the cycle, e.g. ('UF', 'UR', 'UB'): the piece at UF
+#   moves to UR, the one at UR to UB and the one at UB back to UF.
+# twist: 1 if the pieces come back to their places unchanged after going once around the
+#   cycle, 2 if they come back flipped, 3 if they come back twisted.
+PieceCycle = namedtuple('PieceCycle', 'pieces twist')
+
+_NAME_ORDER = 'UDFBRL'
+
+
+def _piece_names():
+    names = {}
+    for piece in facelets.PIECES:
+        faces = sorted((chr(facelets.SOLVED[i]) for i in piece), key=_NAME_ORDER.index)
+        names[piece] = "".join(faces)
+    return names
+
+
+_PIECE_NAMES = _piece_names()
+_PIECE_OF = {i: piece for piece in facelets.PIECES for i in piece}
+
+
+def cycles(perm):
+    """
+    :return: The cycles of length 2 or more of a permutation, each as a tuple of indices
+        (i, perm[i], perm[perm[i]], ...)
+    """
+    seen = set()
+    result = []
+    for start in range(len(perm)):
+        if start in seen:
+            continue
+        cycle = [start]
+        seen.add(start)
+        i = perm[start]
+        while i != start:
+            cycle.append(i)
+            seen.add(i)
+            i = perm[i]
+        if len(cycle) > 1:
+            result.append(tuple(cycle))
+    return result
+
+
+class Algorithm:
+    """
+    A move sequence compiled to its net sticker permutation (see facelets), so that
+    inverses, powers and periods are computed without replaying moves on a Cube.
+    """
+
+    def __init__(self, moves, perm=None):
+        """
+        :param moves: A list of moves, or a string of moves (extended notation is accepted)
+        :param perm: The net permutation of moves, if already known
+        """
+        if isinstance(moves, str):
+            moves = parse_moves(moves)
+        self.moves = list(moves)
+        self.perm = facelets.sequence_perm(self.moves) if perm is None else perm
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __str__(self):
+        return " ".join(self.moves)
+
+    def __repr__(self):
+        return f"Algorithm({str(self)!r})"
+
+    def __mul__(self, other):
+        """
+        :return: This algorithm followed by other
+        """
+        return Algorithm(self.moves + other.moves, facelets.compose(self.perm, other.perm))
+
+    def __pow__(self, k):
+        return self.power(k)
+
+    def same_effect(self, other):
+        return self.perm == other.perm
+
+    def is_identity(self):
+        return self.perm == facelets.IDENTITY
+
+    def inverse(self):
+        return Algorithm(facelets.inverse_sequence(self.moves), facelets.invert(self.perm))
+
+    def order(self):
+        """
+        :return: How many times the algorithm must be repeated to return to the start,
+            the lcm of the lengths of its sticker cycles
+        """
+        return math.lcm(1, *(len(c) for c in cycles(self.perm)))
+
+    def power(self, k):
+        """
+        :return: The algorithm repeated k times (the inverse repeated -k times if k < 0).
+            The permutation takes O(log k) compositions, and the moves are only repeated
+            k modulo the order times.
+        """
+        base = self if k >= 0 else self.inverse()
+        k = abs(k)
+        perm, square = facelets.IDENTITY, base.perm
+        n = k
+        while n:
+            if n & 1:
+                perm = facelets.compose(perm, square)
+            square = facelets.compose(square, square)
+            n >>= 1
+        return Algorithm(base.moves * (k % self.order()), perm)
+
+    def cycle_structure(self):
+        """
+        :return: A list of PieceCycles, one for each cycle of pieces the algorithm moves,
+            and one for each piece it only flips or twists in place
+        """
+        goes_to = {}
+        for i, j in enumerate(self.perm):
+            goes_to[_PIECE_OF[j]] = _PIECE_OF[i]
+
+        result = []
+        seen = set()
+        for piece in facelets.PIECES:
+            if piece in seen:
+                continue
+            cycle = [piece]
+            nxt = goes_to[piece]
+            while nxt != piece:
+                cycle.append(nxt)
+                nxt = goes_to[nxt]
+            seen.update(cycle)
+            # what going once around the cycle does to the stickers of the first piece
+            trip = self.power(len(cycle)).perm
+            twist = 1
+            i = trip[piece[0]]
+            while i != piece[0]:
+                twist += 1
+                i = trip[i]
+            if len(cycle) > 1 or twist > 1:
+                result.append(PieceCycle(tuple(_PIECE_NAMES[p] for p in cycle), twist))
+        return result
+
+    def describe(self):
+        """
+        :return: The cycle structure as text, e.g. "3-cycle UF -> UR -> UB"
+        """
+        lines = []
+        for pieces, twist in self.cycle_structure():
+            if len(pieces) == 1:
+                line = f"{pieces[0]} {'flipped' if twist == 2 else 'twisted'} in place"
+            else:
+                line = f"{len(pieces)}-cycle " + " -> ".join(pieces)
+                if twist > 1:
+                    line += " (flipped)" if twist == 2 else " (twisted)"
+            lines.append(line)
+        return "\n".join(lines) if lines else "identity"
+
+
+def commutator(a, b):
+    """
+    :return: The Algorithm a b a' b'
+    """
+    a, b = _algorithm(a), _algorithm(b)
+    return a * b * a.inverse() * b.inverse()
+
+
+def conjugate(setup, alg):
+    """
+    :return: The Algorithm setup alg setup'
+    """
+    setup, alg = _algorithm(setup), _algorithm(alg)
+    return setup * alg * setup.inverse()
+
+
+def _algorithm(moves):
+    return moves if isinstance(moves, Algorithm) else Algorithm(moves)
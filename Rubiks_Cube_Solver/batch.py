@@ -0,0 +1,63 @@
+import multiprocessing
+from collections import namedtuple
+
+from .cube_model import Cube
+from .cube_solver import build_tables, solve, SolveFailed
+from .move_optimizer import optimize_moves
+from .verify import sequences_equivalent
+
+# moves/opt_moves are None and error holds a message when the solve failed
+SolveResult = namedtuple('SolveResult', 'index cube moves opt_moves error')
+
+
+def _compact(cube):
+    """Cubes cross process boundaries as flat 54 character strings, not Piece graphs"""
+    if isinstance(cube, Cube):
+        return cube.flat_str()
+    return "".join(cube.split())
+
+
+def solve_one(index, cube_str, optimize=True):
+    """
+    Solve a single cube, capturing any error in the result instead of raising it.
+    :return: A SolveResult
+    """
+    try:
+        moves = solve(cube_str).moves
+        opt_moves = None
+        if optimize:
+            opt_moves = optimize_moves(moves)
+            if not sequences_equivalent(moves, opt_moves):
+                return SolveResult(index, cube_str, None, None, "Optimized moves are not equivalent")
+        return SolveResult(index, cube_str, moves, opt_moves, None)
+    except SolveFailed as e:
+        return SolveResult(index, cube_str, None, None, str(e))
+    except Exception as e:
+        return SolveResult(index, cube_str, None, None, f"{type(e).__name__}: {e}")
+
+
+def _solve_task(task):
+    return solve_one(*task)
+
+
+def solve_many(cubes, workers=None, chunksize=16, ordered=True, optimize=True):
+    """
+    Solve many cubes across a process pool.
+    :param cubes: An iterable of Cubes or cube strings. It is consumed lazily.
+    :param workers: Number of worker processes (default: one per CPU). With 1 the cubes
+        are solved in this process.
+    :param chunksize: Number of cubes sent to a worker at a time
+    :param ordered: Yield results in input order, otherwise as they complete
+    :param optimize: Also run optimize_moves on each solution
+    :return: A generator of SolveResults. Failed solves have `error` set.
+    """
+    tasks = ((i, _compact(c), optimize) for i, c in enumerate(cubes))
+    if workers == 1:
+        for task in tasks:
+            yield _solve_task(task)
+        return
+
+    build_tables()
+    with multiprocessing.Pool(workers, initializer=build_tables) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        yield from imap(_solve_task, tasks, chunksize)
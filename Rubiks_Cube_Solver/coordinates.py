@@ -0,0 +1,40 @@
+from . import facelets
+
+# Pieces as tuples of sticker indices (see facelets), and the rank (0-23) of every sticker
+# among the stickers of its kind. Where a few pieces' reference stickers are, as ranks,
+# is a coordinate small enough to tabulate.
+
+CORNERS = [piece for piece in facelets.PIECES if len(piece) == 3]
+EDGES = [piece for piece in facelets.PIECES if len(piece) == 2]
+CORNER_STICKERS = sorted(i for piece in CORNERS for i in piece)
+EDGE_STICKERS = sorted(i for piece in EDGES for i in piece)
+CORNER_RANK = {sticker: rank for rank, sticker in enumerate(CORNER_STICKERS)}
+EDGE_RANK = {sticker: rank for rank, sticker in enumerate(EDGE_STICKERS)}
+
+# the kind of a rank: its index in the pair returned by rank_destinations()
+CORNER, EDGE = 0, 1
+
+
+def find_piece(state, colors):
+    """
+    :param state: A state, usually with stickers named after their faces
+    :param colors: The piece's colors, e.g. 'FU' or 'FUL'
+    :return: The sticker indices of the piece with these colors, in the order of colors,
+        or None if there is no such piece
+    """
+    wanted = [ord(c) for c in colors]
+    for piece in (CORNERS if len(colors) == 3 else EDGES):
+        found = {state[i]: i for i in piece}
+        if set(found) == set(wanted):
+            return [found[c] for c in wanted]
+    return None
+
+
+def rank_destinations(perm):
+    """
+    :return: A pair (corners, edges) giving, for every corner and edge sticker rank, the
+        rank that sticker moves to under perm
+    """
+    inverse = facelets.invert(perm)
+    return (tuple(CORNER_RANK[inverse[s]] for s in CORNER_STICKERS),
+            tuple(EDGE_RANK[inverse[s]] for s in EDGE_STICKERS))
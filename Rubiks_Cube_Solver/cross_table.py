@@ -0,0 +1,70 @@
+from . import coordinates
+from . import facelets
+from .search import CoordinateTable
+
+# The Solver builds its cross on the FRONT face. The cross coordinate is where the front
+# stickers of the four edges FU, FL, FR and FD are: each is one of the 24 edge stickers,
+# giving 24 * 22 * 20 * 18 = 190080 reachable coordinates. Their distances to solved in
+# the half turn metric, at most 8, are tabulated by a search.CoordinateTable.
+
+_CROSS_EDGES = ('U', 'L', 'R', 'D')
+
+
+def _moves():
+    """
+    :return: A list of (quarter turns, cost, permutation) of the half turn metric moves
+    """
+    moves = []
+    for face in 'ULFRBD':
+        for quarters in ([face], [face, face], [face + 'i']):
+            moves.append((quarters, 1, facelets.sequence_perm(quarters)))
+    return moves
+
+
+MOVES = _moves()
+
+_table = None
+
+
+def table():
+    """
+    :return: The (lazily built) CoordinateTable of the cross coordinate
+    """
+    global _table
+    if _table is None:
+        _table = CoordinateTable(cross_ranks(facelets.SOLVED), (coordinates.EDGE,) * 4, MOVES)
+    return _table
+
+
+def cross_ranks(state):
+    """
+    :param state: A state whose stickers are named after their faces (see facelets.relabel)
+    :return: The ranks of the front stickers of FU, FL, FR and FD, or None if one of these
+        edges is missing
+    """
+    ranks = []
+    for other in _CROSS_EDGES:
+        stickers = coordinates.find_piece(state, 'F' + other)
+        if stickers is None:
+            return None
+        ranks.append(coordinates.EDGE_RANK[stickers[0]])
+    return tuple(ranks)
+
+
+def cross_distance(state):
+    """
+    :return: The number of half turn metric moves needed to solve the front cross
+    """
+    ranks = cross_ranks(state)
+    return None if ranks is None else table().distance(ranks)
+
+
+def solve_cross(state):
+    """
+    :param state: A state whose stickers are named after their faces
+    :return: An optimal list of quarter turns (half turns written as two quarter turns)
+        that solves the front cross without rotating the cube, or None if the state has
+        no valid cross edges
+    """
+    ranks = cross_ranks(state)
+    return None if ranks is None else table().path(ranks)
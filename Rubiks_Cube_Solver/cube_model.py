@@ -1,6 +1,7 @@
 import string
 
 from .geometry import Vec3, Matrix
+from .notation import parse_moves
 
 RIGHT = X_AXIS = Vec3(1, 0, 0)
 LEFT           = Vec3(-1, 0, 0)
@@ -248,8 +249,9 @@ class Cube:
     def sequence(self, move_str):
         """
         :param moves: A string containing notated moves separated by spaces: "L Ri U M Ui B M"
+            Extended notation is accepted too: "R2 U' r x"
         """
-        moves = [getattr(self, name) for name in move_str.split()]
+        moves = [getattr(self, name) for name in parse_moves(move_str)]
         for move in moves:
             move()
 
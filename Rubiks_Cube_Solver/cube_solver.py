@@ -1,4 +1,12 @@
+import itertools
+import time
+from collections import namedtuple
+
 from Rubiks_Cube_Solver import cube_model as cube
+from . import facelets
+from . import cross_table
+from . import pair_table
+from .framed_cube import FramedCube
 from .geometry import Vec3
 # Add to cube_solver.py
 from .geometry import Matrix
@@ -6,12 +14,46 @@ from .geometry import Matrix
 DEBUG = False
 
 
-class Solver:
+class SolveFailed(Exception):
+    """Raised by solve() when the Solver's moves do not solve the cube"""
+
 
-    def __init__(self, c):
-        self.cube = c
+# moves: the Solver's moves. cube: the solved cube as a 54 character string, unchanged.
+# phase_times: seconds spent in each phase, by phase name.
+Solution = namedtuple('Solution', 'moves cube phase_times')
+
+
+class Solver:
+    # names of the methods solve() runs in order
+    PHASES = ('cross', 'first_two_layers', 'back_face_edges',
+              'last_layer_corners_position', 'last_layer_corners_orientation', 'last_layer_edges')
+    # moves searched forward from the cube before giving up on the short_table: most cubes
+    # are far from solved and go straight to the phases
+    SHORT_TABLE_FORWARD = 1
+
+    def __init__(self, c, short_table=None, move_stream=None, virtual_rotations=False,
+                 record_rotations=True):
+        """
+        :param c: The Cube to solve. It is solved in place.
+        :param short_table: An optional ShortDistanceTable. Cubes within its depth (plus
+            SHORT_TABLE_FORWARD) get an optimal solution instead of going through the phases.
+        :param move_stream: An optional move_optimizer.MoveStream. Moves are passed
+            through it as they are made, so self.moves holds the optimized moves.
+        :param virtual_rotations: If True, whole-cube rotations only change the frame the
+            cube is seen through (see framed_cube) instead of turning all 26 pieces.
+        :param record_rotations: If False, self.moves holds the turns made to c, renamed
+            through the frame, with no rotations. Needs virtual_rotations.
+        """
+        if not (record_rotations or virtual_rotations):
+            raise ValueError("record_rotations=False needs virtual_rotations=True")
+        self.cube = FramedCube(c) if virtual_rotations else c
+        self.record_rotations = record_rotations
         self.colors = c.colors()
         self.moves = []
+        self.short_table = short_table
+        self.move_stream = move_stream
+        # seconds spent in each phase of the last solve(), by phase name
+        self.phase_times = {}
 
         self.left_piece  = self.cube.find_piece(self.cube.left_color())
         self.right_piece = self.cube.find_piece(self.cube.right_color())
@@ -20,29 +62,66 @@ class Solver:
 
         self.infinite_loop_max_iterations = 12
 
-    def solve(self):
+    def phases(self):
+        return tuple(getattr(self, name) for name in self.PHASES)
+
+    def solve(self, start=0):
+        """
+        :param start: Index in PHASES of the first phase to run. The earlier phases must
+            already have been made, and their moves given to record().
+        """
         if DEBUG: print(self.cube)
-        self.cross()
-        if DEBUG: print('Cross:\n', self.cube)
-        self.cross_corners()
-        if DEBUG: print('Corners:\n', self.cube)
-        self.second_layer()
-        if DEBUG: print('Second layer:\n', self.cube)
-        self.back_face_edges()
-        if DEBUG: print('Last layer edges\n', self.cube)
-        self.last_layer_corners_position()
-        if DEBUG: print('Last layer corners -- position\n', self.cube)
-        self.last_layer_corners_orientation()
-        if DEBUG: print('Last layer corners -- orientation\n', self.cube)
-        self.last_layer_edges()
-        if DEBUG: print('Solved\n', self.cube)
+        if self.short_table is not None and start == 0:
+            moves = self.short_table.solve(self.cube, self.short_table.depth + self.SHORT_TABLE_FORWARD)
+            if moves is not None:
+                self.move(" ".join(moves))
+                self._finish()
+                return
+        for phase in self.phases()[start:]:
+            phase_start = time.perf_counter()
+            phase()
+            self.phase_times[phase.__name__] = time.perf_counter() - phase_start
+            if DEBUG: print(phase.__name__, '\n', self.cube)
+        self._finish()
+
+    def _finish(self):
+        if self.move_stream is not None:
+            self.moves.extend(self.move_stream.flush())
+        # the recorded rotations were only tracked: make them, so c ends as they say
+        if self.record_rotations and isinstance(self.cube, FramedCube):
+            self.cube.materialize()
 
     def move(self, move_str):
-        self.moves.extend(move_str.split())
-        self.cube.sequence(move_str)
+        performed = self.cube.sequence(move_str)
+        self.record(move_str.split() if self.record_rotations else performed)
+
+    def record(self, moves):
+        """
+        Add moves to self.moves (through the move_stream, if any) without making them
+        """
+        if self.move_stream is None:
+            self.moves.extend(moves)
+        else:
+            for move in moves:
+                self.moves.extend(self.move_stream.push(move))
 
     def cross(self):
+        """
+        Solve the front cross optimally from the cross distance table, without rotating
+        the cube. Falls back to placing the edges one by one if the cross edges are invalid.
+        """
         if DEBUG: print("cross")
+        try:
+            state = facelets.relabel(facelets.to_state(self.cube))[0]
+        except ValueError:
+            state = None
+        moves = None if state is None else cross_table.solve_cross(state)
+        if moves is None:
+            self.cross_by_pieces()
+        elif moves:
+            self.move(" ".join(moves))
+
+    def cross_by_pieces(self):
         # place the UP-LEFT piece
         fl_piece = self.cube.find_piece(self.cube.front_color(), self.cube.left_color())
         fr_piece = self.cube.find_piece(self.cube.front_color(), self.cube.right_color())
@@ -106,6 +185,24 @@ class Solver:
         else:
             self.move(move_2)
 
+    def first_two_layers(self):
+        """
+        Fill the four front corner + middle edge slots with the pair tables, in the
+        cheapest slot order. Falls back to cross_corners() and second_layer() if a pair
+        cannot be placed that way.
+        """
+        if DEBUG: print("first_two_layers")
+        try:
+            state = facelets.relabel(facelets.to_state(self.cube))[0]
+        except ValueError:
+            state = None
+        moves = None if state is None else pair_table.solve_pairs(state)
+        if moves is None:
+            self.cross_corners()
+            self.second_layer()
+        elif moves:
+            self.move(" ".join(moves))
+
     def cross_corners(self):
         if DEBUG: print("cross_corners")
         fld_piece = self.cube.find_piece(self.cube.front_color(), self.cube.left_color(), self.cube.down_color())
@@ -506,6 +603,70 @@ class Solver:
                self.cube[cube.LEFT + cube.FRONT].colors[0] == self.cube.left_color()
 
 
+def build_tables():
+    """
+    Build the cross and pair tables of the Solver's table phases, if not built yet. Call it
+    before starting worker processes, so forked workers share the tables instead of each
+    building them in its first solve, and use it as the pool initializer, so workers that
+    are not forked build them when they start.
+    """
+    cross_table.table()
+    for slot in pair_table.SLOTS:
+        others = [other for other in pair_table.SLOTS if other != slot]
+        for n in range(len(others) + 1):
+            for filled in itertools.combinations(others, n):
+                pair_table.table(slot, filled)
+
+
+def _table_phases(state):
+    """
+    Run the table phases, the first of Solver.PHASES, on a compact state, as the Solver
+    would, up to the first one whose table has no solution.
+    :return: A pair (list of (phase name, moves, seconds) for the phases made, the state
+        after them)
+    """
+    done = []
+    try:
+        labels = facelets.relabel(state)[0]
+    except ValueError:
+        return done, state
+    for name, solve_phase in (('cross', cross_table.solve_cross), ('first_two_layers', pair_table.solve_pairs)):
+        start = time.perf_counter()
+        moves = solve_phase(labels)
+        if moves is None:
+            break
+        perm = facelets.sequence_perm(moves)
+        labels = facelets.apply(labels, perm)
+        state = facelets.apply(state, perm)
+        done.append((name, moves, time.perf_counter() - start))
+    return done, state
+
+
+def solve(state, **solver_args):
+    """
+    Solve a cube without modifying it, and verify the moves by permutation composition.
+    The table phases (cross and first_two_layers) are solved on the 54 byte state; a Cube
+    is only built, from the state they leave, for the Solver's piece-based phases after
+    them. With a short_table the Solver starts from the whole cube instead.
+    :param state: A Cube, a cube string (whitespace is ignored) or a 54 byte state
+    :param solver_args: Extra arguments for Solver, e.g. short_table. Rotations are
+        virtual unless virtual_rotations=False is given; the moves are the same.
+    :return: A Solution
+    :raises SolveFailed: If the moves found do not solve the cube
+    """
+    solver_args.setdefault('virtual_rotations', True)
+    state = facelets.to_state(state)
+    done, current = ([], state) if solver_args.get('short_table') is not None else _table_phases(state)
+    solver = Solver(cube.Cube(current.decode('ascii')), **solver_args)
+    for name, moves, seconds in done:
+        solver.record(moves)
+        solver.phase_times[name] = seconds
+    solver.solve(len(done))
+    if not facelets.is_solved(facelets.apply(state, facelets.sequence_perm(solver.moves))):
+        raise SolveFailed("Solver finished but cube is not solved")
+    return Solution(solver.moves, state.decode('ascii'), solver.phase_times)
+
+
 if __name__ == '__main__':
     # Test code here
     import time
@@ -0,0 +1,100 @@
+from . import facelets
+from .cube_model import Cube
+from .notation import expand_token
+
+_token_perms = {}
+
+
+def _token_perm(token):
+    perm = _token_perms.get(token)
+    if perm is None:
+        perm = _token_perms[token] = facelets.compose(*(facelets.MOVE_PERMS[m] for m in expand_token(token)))
+    return perm
+
+
+class CubeState:
+    """
+    An immutable cube: 54 sticker colors in Cube.flat_str() order. Moves return new
+    states, all sharing the permutation tables of facelets, so states can be passed
+    between threads and used as dict keys without copying.
+    """
+    __slots__ = ('_state',)
+
+    def __init__(self, state=facelets.SOLVED):
+        """
+        :param state: A Cube, a cube string (whitespace is ignored), a 54 byte state or a
+            CubeState. The solved cube with stickers named after their faces if not given.
+        """
+        if isinstance(state, CubeState):
+            state = state._state
+        object.__setattr__(self, '_state', facelets.to_state(state))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CubeState is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("CubeState is immutable")
+
+    @classmethod
+    def _from_bytes(cls, state):
+        result = object.__new__(cls)
+        object.__setattr__(result, '_state', state)
+        return result
+
+    @property
+    def state(self):
+        return self._state
+
+    def apply(self, move):
+        """
+        :param move: One move, e.g. "R", "Ri", "R'", "R2" or "x"
+        :return: A new CubeState
+        """
+        return CubeState._from_bytes(facelets.apply(self._state, _token_perm(move)))
+
+    def apply_seq(self, moves):
+        """
+        :param moves: A list of moves, or a string of moves separated by spaces, each as
+            for apply()
+        :return: A new CubeState
+        """
+        if not isinstance(moves, str):
+            moves = [m for move in moves for m in expand_token(move)]
+        return CubeState._from_bytes(facelets.apply(self._state, facelets.sequence_perm(moves)))
+
+    def apply_perm(self, perm):
+        return CubeState._from_bytes(facelets.apply(self._state, perm))
+
+    def is_solved(self):
+        return facelets.is_solved(self._state)
+
+    def flat_str(self):
+        return self._state.decode('ascii')
+
+    @classmethod
+    def from_cube(cls, cube):
+        return cls(cube)
+
+    def to_cube(self):
+        """
+        :return: A new (mutable) Cube with this state
+        """
+        return Cube(self.flat_str())
+
+    def __eq__(self, other):
+        return isinstance(other, CubeState) and self._state == other._state
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __hash__(self):
+        return hash(self._state)
+
+    def __reduce__(self):
+        return CubeState, (self._state,)
+
+    def __repr__(self):
+        return f"CubeState({self.flat_str()!r})"
+
+    def __str__(self):
+        return str(self.to_cube())
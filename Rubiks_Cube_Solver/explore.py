@@ -0,0 +1,359 @@
+"""Breadth-first enumeration of cube states by distance from solved.
+
+    python -m Rubiks_Cube_Solver.explore --depth 5 --metric htm --out frontiers/
+
+Needs numpy. States are compact coordinate keys: each of the 8 corner and 12 edge slots
+holds the rank (0-23) of the home sticker now on its reference sticker, 5 bits each,
+packed into two uint64 (corners, edges). Centers never move, so only face turns are
+allowed. Every key array is kept sorted by (corners, edges) and free of duplicates.
+
+The move sets are closed under inverses, so a neighbour of a state at distance d is at
+distance d-1, d or d+1: only the two previous frontiers are needed to tell new states from
+visited ones. The frontier is expanded a chunk at a time, each chunk giving a sorted run
+of distinct neighbours. With out_dir the runs are written there and memory-mapped, then
+merged block by block, filtered against the previous frontiers a block at a time and
+streamed into depth_NN.npy. Frontiers larger than mmap_threshold are read back
+memory-mapped, so no whole layer has to fit in RAM. Without out_dir everything stays in
+memory.
+"""
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from . import coordinates
+from . import facelets
+
+_SLOTS = coordinates.CORNERS + coordinates.EDGES
+_SLOT_OF = {i: n for n, slot in enumerate(_SLOTS) for i in slot}
+_RANK = {**coordinates.CORNER_RANK, **coordinates.EDGE_RANK}
+_STICKER = {(len(_SLOTS[_SLOT_OF[s]]), r): s for s, r in _RANK.items()}
+
+
+def _rigid_maps():
+    """
+    Every cubie is moved by a rotation, so the stickers of a slot are determined by the
+    home sticker on its reference sticker.
+    :return: A dict (slot, home sticker on the reference sticker) -> {slot sticker: home sticker}
+    """
+    maps = {}
+    for matrix in facelets.ROTATION_MATRICES:
+        perm = facelets.perm_from_matrix(matrix)
+        for n, slot in enumerate(_SLOTS):
+            maps[n, perm[slot[0]]] = {j: perm[j] for j in slot}
+    return maps
+
+
+_RIGID = _rigid_maps()
+
+
+def move_set(metric='htm', faces='ULFRBD'):
+    """
+    :param metric: 'htm' (quarter and half turns) or 'qtm' (quarter turns only)
+    :param faces: The faces that may turn
+    :return: A dict move name -> sticker permutation, e.g. {'R': ..., 'R2': ..., 'Ri': ...}
+    """
+    if metric not in ('htm', 'qtm'):
+        raise ValueError(f"Unknown metric: {metric}")
+    moves = {}
+    for face in faces:
+        perm = facelets.MOVE_PERMS[face]
+        moves[face] = perm
+        if metric == 'htm':
+            moves[face + '2'] = facelets.compose(perm, perm)
+        moves[face + 'i'] = facelets.MOVE_PERMS[face + 'i']
+    return moves
+
+
+def state_values(state):
+    """
+    :param state: A state whose stickers are named after their faces, with centers in place
+    :return: The 20 slot values of the state, corners first
+    """
+    perm = facelets.state_perm(state)
+    return [_RANK[perm[slot[0]]] for slot in _SLOTS]
+
+
+def state_key(state):
+    """
+    :return: The packed key (corners, edges) of a state, as Python ints
+    """
+    values = state_values(state)
+    return (sum(v << (5 * i) for i, v in enumerate(values[:8])),
+            sum(v << (5 * i) for i, v in enumerate(values[8:])))
+
+
+def _move_table(perm):
+    """
+    :return: (src, lut): after the move, slot n holds lut[n][v] where v is the value that
+        was in slot src[n]
+    """
+    src, lut = [], []
+    for n, slot in enumerate(_SLOTS):
+        s = perm[slot[0]]
+        source = _SLOT_OF[s]
+        size = len(_SLOTS[source])
+        src.append(source)
+        row = [0] * 24
+        for v in range(24):
+            row[v] = _RANK[_RIGID[source, _STICKER[size, v]][s]]
+        lut.append(row)
+    return src, lut
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Rubiks_Cube_Solver.explore requires numpy")
+
+
+def _pack(values):
+    keys = np.zeros((len(values), 2), dtype=np.uint64)
+    for i in range(8):
+        keys[:, 0] |= values[:, i].astype(np.uint64) << np.uint64(5 * i)
+    for i in range(12):
+        keys[:, 1] |= values[:, 8 + i].astype(np.uint64) << np.uint64(5 * i)
+    return keys
+
+
+def _unpack(keys):
+    values = np.empty((len(keys), 20), dtype=np.uint8)
+    for i in range(8):
+        values[:, i] = (keys[:, 0] >> np.uint64(5 * i)) & np.uint64(31)
+    for i in range(12):
+        values[:, 8 + i] = (keys[:, 1] >> np.uint64(5 * i)) & np.uint64(31)
+    return values
+
+
+def _unique(keys):
+    """
+    :return: The distinct rows of keys, sorted by (corners, edges)
+    """
+    if len(keys) == 0:
+        return keys
+    keys = keys[np.lexsort((keys[:, 1], keys[:, 0]))]
+    keep = np.ones(len(keys), dtype=bool)
+    keep[1:] = np.any(keys[1:] != keys[:-1], axis=1)
+    return keys[keep]
+
+
+def _concatenate(blocks):
+    if not blocks:
+        return np.empty((0, 2), dtype=np.uint64)
+    return np.concatenate(blocks)
+
+
+def _search(keys, key, side='left'):
+    """
+    Binary search reading single rows, so a memory-mapped array is not read in full.
+    :param keys: Sorted keys
+    :return: Where key would be inserted into keys, as numpy.searchsorted
+    """
+    key = (int(key[0]), int(key[1]))
+    lo, hi = 0, len(keys)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        row = keys[mid]
+        row = (int(row[0]), int(row[1]))
+        if row < key or (side == 'right' and row == key):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _isin(keys, other):
+    """
+    :param keys: Sorted, distinct keys
+    :param other: Sorted, distinct keys
+    :return: A bool array, True for the keys that are also in other
+    """
+    combined = np.concatenate((other, keys))
+    tags = np.concatenate((np.zeros(len(other), dtype=np.uint8), np.ones(len(keys), dtype=np.uint8)))
+    order = np.lexsort((tags, combined[:, 1], combined[:, 0]))
+    combined, tags = combined[order], tags[order]
+    seen = np.zeros(len(combined), dtype=bool)
+    seen[1:] = np.all(combined[1:] == combined[:-1], axis=1)
+    return seen[tags == 1]
+
+
+def _difference(blocks, visited, chunk_size):
+    """
+    :param blocks: Sorted, distinct key blocks, each after the one before
+    :param visited: Sorted, distinct keys, possibly memory-mapped
+    :return: An iterator of the blocks without the keys in visited. Only the part of
+        visited in each block's range is read, chunk_size rows at a time.
+    """
+    for block in blocks:
+        if len(block) == 0:
+            continue
+        lo = _search(visited, block[0])
+        hi = _search(visited, block[-1], 'right')
+        keep = np.ones(len(block), dtype=bool)
+        for start in range(lo, hi, chunk_size):
+            keep &= ~_isin(block, np.asarray(visited[start:min(start + chunk_size, hi)]))
+        yield block[keep]
+
+
+def _merge(runs, block_size):
+    """
+    k-way merge: each round takes a block from every run, and everything up to the
+    smallest last key of those blocks, which no later round can contain.
+    :param runs: Sorted, distinct keys, possibly memory-mapped
+    :return: An iterator of sorted, distinct key blocks, each after the one before
+    """
+    positions = [0] * len(runs)
+    while True:
+        blocks = [(n, np.asarray(run[positions[n]:positions[n] + block_size]))
+                  for n, run in enumerate(runs) if positions[n] < len(run)]
+        if not blocks:
+            return
+        bound = min((int(block[-1, 0]), int(block[-1, 1])) for _, block in blocks)
+        parts = []
+        for n, block in blocks:
+            taken = _search(block, bound, 'right')
+            parts.append(block[:taken])
+            positions[n] += taken
+        yield _unique(np.concatenate(parts))
+
+
+class Explorer:
+
+    def __init__(self, metric='htm', faces='ULFRBD', out_dir=None, chunk_size=1 << 18, mmap_threshold=1 << 24):
+        """
+        :param metric: 'htm' or 'qtm', see move_set()
+        :param faces: The faces that may turn
+        :param out_dir: Directory for the depth_NN.npy frontier files and the temporary
+            runs (none are written, and everything is kept in RAM, if None)
+        :param chunk_size: Number of states expanded, merged or compared at a time
+        :param mmap_threshold: Frontiers with more states than this are memory-mapped from
+            out_dir rather than kept in RAM
+        """
+        _require_numpy()
+        self.metric = metric
+        self.faces = faces
+        self.out_dir = out_dir
+        self.chunk_size = chunk_size
+        self.mmap_threshold = mmap_threshold
+        self.tables = []
+        for perm in move_set(metric, faces).values():
+            src, lut = _move_table(perm)
+            self.tables.append((np.array(src), np.array(lut, dtype=np.uint8)))
+        self._slots = np.arange(20)
+        self._run_files = []
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+
+    def _runs(self, keys):
+        """
+        :return: A list of sorted runs of distinct neighbours, one per chunk of keys,
+            memory-mapped from out_dir if there is one
+        """
+        runs = []
+        for start in range(0, len(keys), self.chunk_size):
+            values = _unpack(np.asarray(keys[start:start + self.chunk_size]))
+            run = _unique(np.concatenate([_pack(lut[self._slots, values[:, src]]) for src, lut in self.tables]))
+            if self.out_dir:
+                path = os.path.join(self.out_dir, f"run_{len(runs):05d}.npy")
+                np.save(path, run)
+                self._run_files.append(path)
+                run = np.load(path, mmap_mode='r')
+            runs.append(run)
+        return runs
+
+    def _remove_runs(self):
+        for path in self._run_files:
+            os.remove(path)
+        self._run_files = []
+
+    def _neighbours(self, keys):
+        runs = self._runs(keys)
+        return _merge(runs, max(1024, self.chunk_size // max(1, len(runs))))
+
+    def expand(self, keys):
+        """
+        :return: The distinct keys one move away from any of keys
+        """
+        try:
+            return _concatenate(list(self._neighbours(keys)))
+        finally:
+            self._remove_runs()
+
+    def _path(self, depth):
+        return os.path.join(self.out_dir, f"depth_{depth:02d}.npy")
+
+    def _store(self, depth, blocks):
+        """
+        :param blocks: Sorted key blocks of the frontier at depth
+        :return: The frontier, memory-mapped if it has more than mmap_threshold states
+        """
+        if not self.out_dir:
+            return _concatenate(list(blocks))
+        path = self._path(depth)
+        raw = path + ".tmp"
+        count = 0
+        with open(raw, 'wb') as f:
+            for block in blocks:
+                np.ascontiguousarray(block, dtype=np.uint64).tofile(f)
+                count += len(block)
+        keys = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint64, shape=(count, 2))
+        if count:
+            source = np.memmap(raw, dtype=np.uint64, mode='r', shape=(count, 2))
+            for start in range(0, count, self.chunk_size):
+                keys[start:start + self.chunk_size] = source[start:start + self.chunk_size]
+            del source
+        keys.flush()
+        del keys
+        os.remove(raw)
+        return np.load(path, mmap_mode='r' if count > self.mmap_threshold else None)
+
+    def run(self, max_depth):
+        """
+        :return: A list with the number of states at each distance 0 to max_depth.
+            The list is shorter if every state was reached before max_depth.
+        """
+        solved = _pack(np.array([state_values(facelets.SOLVED)], dtype=np.uint8))
+        previous = np.empty((0, 2), dtype=np.uint64)
+        frontier = self._store(0, [solved])
+        counts = [1]
+        for depth in range(1, max_depth + 1):
+            blocks = self._neighbours(frontier)
+            blocks = _difference(_difference(blocks, frontier, self.chunk_size), previous, self.chunk_size)
+            try:
+                new = self._store(depth, blocks)
+            finally:
+                self._remove_runs()
+            if len(new) == 0:
+                if self.out_dir:
+                    os.remove(self._path(depth))
+                break
+            previous, frontier = frontier, new
+            counts.append(len(new))
+        return counts
+
+
+def distance_distribution(max_depth, metric='htm', faces='ULFRBD', out_dir=None):
+    """
+    :return: A list with the number of states at each distance 0 to max_depth
+    """
+    return Explorer(metric, faces, out_dir).run(max_depth)
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description="Count cube states by distance from solved")
+    parser.add_argument('--depth', type=int, default=5, help='Maximum distance to explore')
+    parser.add_argument('--metric', type=str, default='htm', choices=('htm', 'qtm'), help='Turn metric')
+    parser.add_argument('--faces', type=str, default='ULFRBD', help='Faces that may turn')
+    parser.add_argument('--out', type=str, default=None, help='Directory to write each frontier to')
+    args = parser.parse_args()
+
+    explorer = Explorer(args.metric, args.faces, args.out)
+    start = time.time()
+    counts = explorer.run(args.depth)
+    print(f"{'distance':>8} {'states':>14}")
+    for depth, count in enumerate(counts):
+        print(f"{depth:>8} {count:>14}")
+    print(f"{sum(counts)} states in {time.time() - start:.1f}s")
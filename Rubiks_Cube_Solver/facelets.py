@@ -0,0 +1,223 @@
+import string
+
+from .cube_model import Cube
+from .geometry import Vec3, Matrix
+from .notation import parse_moves
+
+# A state is a bytes object of 54 sticker colors in Cube.flat_str() order. A permutation
+# is a bytes object of 54 sticker indices: applying `perm` to `state` gives a new state
+# where new[i] = state[perm[i]]. Both are bytes so that bytes.translate() does the work.
+
+_LABELS = (string.digits + string.ascii_letters)[:54]
+_PAD = bytes(range(54, 256))
+
+IDENTITY = bytes(range(54))
+
+# sticker indices of the six center pieces
+CENTERS = {'U': 4, 'L': 22, 'F': 25, 'R': 28, 'B': 31, 'D': 49}
+
+MOVES = ('L', 'Li', 'R', 'Ri', 'U', 'Ui', 'D', 'Di', 'F', 'Fi', 'B', 'Bi',
+         'M', 'Mi', 'E', 'Ei', 'S', 'Si', 'X', 'Xi', 'Y', 'Yi', 'Z', 'Zi')
+FACE_MOVES = MOVES[:12]
+SLICE_MOVES = MOVES[12:18]
+ROTATIONS = MOVES[18:]
+
+
+def _sticker_layout():
+    cube = Cube(_LABELS)
+    stickers = [None] * 54
+    for piece in cube.pieces:
+        for axis, label in enumerate(piece.colors):
+            if label is None:
+                continue
+            normal = [0, 0, 0]
+            normal[axis] = piece.pos[axis]
+            stickers[_LABELS.index(label)] = (tuple(piece.pos), tuple(normal))
+    return tuple(stickers)
+
+
+# (piece position, outward normal) of every sticker
+STICKERS = _sticker_layout()
+_STICKER_INDEX = {sticker: i for i, sticker in enumerate(STICKERS)}
+
+
+_NORMAL_FACES = {(0, 1, 0): 'U', (-1, 0, 0): 'L', (0, 0, 1): 'F',
+                 (1, 0, 0): 'R', (0, 0, -1): 'B', (0, -1, 0): 'D'}
+
+# the solved state, with every sticker named after its face
+SOLVED = bytes(ord(_NORMAL_FACES[normal]) for _, normal in STICKERS)
+
+# the sticker indices of each face
+FACES = {face: tuple(i for i, (_, normal) in enumerate(STICKERS) if _NORMAL_FACES[normal] == face)
+         for face in 'ULFRBD'}
+
+
+def _piece_stickers():
+    pieces = {}
+    for i, (pos, _) in enumerate(STICKERS):
+        pieces.setdefault(pos, []).append(i)
+    return tuple(tuple(stickers) for stickers in pieces.values())
+
+
+# the sticker indices of each of the 26 pieces
+PIECES = _piece_stickers()
+_HOME_STICKERS = {frozenset(SOLVED[i] for i in piece): {SOLVED[i]: i for i in piece}
+                  for piece in PIECES}
+
+
+def sticker_index(pos, normal):
+    """
+    :return: The index of the sticker on the piece at `pos` facing `normal`
+    """
+    return _STICKER_INDEX[(tuple(pos), tuple(normal))]
+
+
+def perm_from_matrix(matrix):
+    """
+    :param matrix: A signed permutation Matrix (a rotation or a reflection of the whole cube)
+    :return: The sticker permutation that moves every sticker through `matrix`
+    """
+    perm = [0] * 54
+    for i, (pos, normal) in enumerate(STICKERS):
+        perm[sticker_index(matrix * Vec3(pos), matrix * Vec3(normal))] = i
+    return bytes(perm)
+
+
+def _move_perm(name):
+    cube = Cube(_LABELS)
+    getattr(cube, name)()
+    return bytes(_LABELS.index(c) for c in cube.flat_str())
+
+
+MOVE_PERMS = {name: _move_perm(name) for name in MOVES}
+_PERM_MOVES = {perm: name for name, perm in MOVE_PERMS.items()}
+
+
+def move_for_perm(perm):
+    """
+    :return: The name of the single move with the given permutation, or None
+    """
+    return _PERM_MOVES.get(perm)
+
+
+def compose(*perms):
+    """
+    :return: The permutation of applying each of `perms` in turn
+    """
+    result = IDENTITY
+    for perm in perms:
+        result = perm.translate(result + _PAD)
+    return result
+
+
+def invert(perm):
+    inverse = bytearray(54)
+    for i, j in enumerate(perm):
+        inverse[j] = i
+    return bytes(inverse)
+
+
+def sequence_perm(moves):
+    """
+    :param moves: An iterable of move names, or a string of moves (extended notation is
+        accepted) separated by spaces
+    :return: The net permutation of the sequence
+    """
+    if isinstance(moves, str):
+        moves = parse_moves(moves)
+    result = IDENTITY
+    for move in moves:
+        result = MOVE_PERMS[move].translate(result + _PAD)
+    return result
+
+
+def inverse_sequence(moves):
+    """
+    :return: The moves that undo `moves`, e.g. ['R', 'Ui'] -> ['U', 'Ri']
+    """
+    return [move_for_perm(invert(MOVE_PERMS[move])) for move in reversed(moves)]
+
+
+def apply(state, perm):
+    """
+    :return: `state` with `perm` applied to it
+    """
+    return perm.translate(state + _PAD)
+
+
+def to_state(cube):
+    """
+    :param cube: A Cube (or FramedCube), a cube string (whitespace is ignored) or a state
+    :return: The cube as a 54 byte state
+    """
+    if isinstance(cube, bytes):
+        state = cube
+    else:
+        if not isinstance(cube, str):
+            cube = cube.flat_str()
+        state = "".join(cube.split()).encode('ascii')
+    if len(state) != 54:
+        raise ValueError(f"A cube state requires 54 stickers, got {len(state)}")
+    return state
+
+
+def state_perm(state):
+    """
+    :param state: A state whose stickers are named after their faces (see relabel())
+    :return: The permutation p with apply(SOLVED, p) == state
+    """
+    perm = bytearray(54)
+    for piece in PIECES:
+        home = _HOME_STICKERS.get(frozenset(state[i] for i in piece))
+        if home is None or len(home) != len(piece):
+            raise ValueError(f"Invalid piece colors in {state.decode('ascii')}")
+        for i in piece:
+            perm[i] = home[state[i]]
+    if len(set(perm)) != 54:
+        raise ValueError(f"Duplicate pieces in {state.decode('ascii')}")
+    return bytes(perm)
+
+
+def is_solved(state):
+    """
+    :return: True if every face of the state is a single color, in any orientation
+    """
+    return all(len(set(state[i] for i in stickers)) == 1 for stickers in FACES.values())
+
+
+def relabel(state):
+    """
+    Recolor a state so that each sticker is named after the face whose center shares
+    its color, e.g. the color of the UP center becomes 'U'.
+    :return: A pair (relabeled state, {face letter: original color})
+    """
+    table = bytearray(range(256))
+    colors = {}
+    for face, i in CENTERS.items():
+        table[state[i]] = ord(face)
+        colors[face] = chr(state[i])
+    if len(set(colors.values())) != 6:
+        raise ValueError(f"Center colors must be distinct: {state.decode('ascii')}")
+    return state.translate(table), colors
+
+
+def _signed_permutation_matrices():
+    matrices = []
+    for axes in ((0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1), (2, 1, 0)):
+        for signs in ((1, 1, 1), (1, 1, -1), (1, -1, 1), (1, -1, -1),
+                      (-1, 1, 1), (-1, 1, -1), (-1, -1, 1), (-1, -1, -1)):
+            vals = [0] * 9
+            for row, (axis, sign) in enumerate(zip(axes, signs)):
+                vals[3 * row + axis] = sign
+            matrices.append(Matrix(vals))
+    return matrices
+
+
+def determinant(m):
+    a, b, c, d, e, f, g, h, i = m.vals
+    return a * (e * i - f * h) - b * (d * i - f * g) + c * (d * h - e * g)
+
+
+# the 48 symmetries of the cube, the 24 rotations first (identity at index 0)
+SYMMETRY_MATRICES = tuple(sorted(_signed_permutation_matrices(), key=lambda m: -determinant(m)))
+ROTATION_MATRICES = SYMMETRY_MATRICES[:24]
@@ -0,0 +1,191 @@
+from . import facelets
+from .cube_model import Cube, ROT_XY_CW, ROT_XY_CC, ROT_XZ_CW, ROT_XZ_CC, ROT_YZ_CW, ROT_YZ_CC
+from .geometry import Vec3
+from .notation import parse_moves
+
+# A FramedCube is a Cube seen through a frame: a whole-cube rotation that is tracked
+# instead of made. The frame is a signed permutation of the axes, ((j0, s0), (j1, s1),
+# (j2, s2)): coordinate i of a position in the frame is s_i times coordinate j_i of the
+# real position. Rotating the cube only switches to another of the 24 frames; face and
+# slice turns are renamed through the frame and made on the real Cube.
+
+_FACE_AXES = {'R': (0, 1), 'L': (0, -1), 'U': (1, 1), 'D': (1, -1), 'F': (2, 1), 'B': (2, -1)}
+_AXIS_FACES = {axis: face for face, axis in _FACE_AXES.items()}
+# each slice turns the same way as the face named here: M as L, E as D, S as F
+_SLICE_AXES = {'M': (0, -1), 'E': (1, -1), 'S': (2, 1)}
+_AXIS_SLICES = {axis: name for name, (axis, _) in _SLICE_AXES.items()}
+_ROTATIONS = {'X': ROT_YZ_CW, 'Xi': ROT_YZ_CC, 'Y': ROT_XZ_CW, 'Yi': ROT_XZ_CC, 'Z': ROT_XY_CW, 'Zi': ROT_XY_CC}
+_TURNS = [base + suffix for base in 'LRUDFBMES' for suffix in ('', 'i')]
+
+IDENTITY = ((0, 1), (1, 1), (2, 1))
+
+
+def _invert(move):
+    return move[:-1] if move.endswith('i') else move + 'i'
+
+
+def _real_move(axes, name):
+    """
+    :return: The name of the turn of the real Cube that is the turn `name` in the frame axes
+    """
+    base = name[0]
+    if base in _FACE_AXES:
+        axis, sign = _FACE_AXES[base]
+        j, s = axes[axis]
+        return _AXIS_FACES[j, sign * s] + name[1:]
+    axis, sign = _SLICE_AXES[base]
+    j, s = axes[axis]
+    real = _AXIS_SLICES[j]
+    return real + name[1:] if _SLICE_AXES[real][1] == sign * s else _invert(real + name[1:])
+
+
+def _rotate(axes, matrix):
+    """
+    :return: The frame after rotating the cube seen through axes by matrix
+    """
+    result = []
+    for i in range(3):
+        k = next(k for k in range(3) if matrix.vals[3 * i + k])
+        j, s = axes[k]
+        result.append((j, matrix.vals[3 * i + k] * s))
+    return tuple(result)
+
+
+class _Frame:
+
+    def __init__(self, axes, rotations):
+        """
+        :param axes: The signed axis permutation
+        :param rotations: Whole-cube rotations taking the real Cube to this frame
+        """
+        self.axes = axes
+        self.rotations = rotations
+        self.perm = facelets.sequence_perm(list(rotations))
+        self.moves = {name: _real_move(axes, name) for name in _TURNS}
+        self.next = {}
+
+
+def _frames():
+    frames = {IDENTITY: _Frame(IDENTITY, ())}
+    queue = [frames[IDENTITY]]
+    for frame in queue:
+        for name, matrix in _ROTATIONS.items():
+            axes = _rotate(frame.axes, matrix)
+            if axes not in frames:
+                frames[axes] = _Frame(axes, frame.rotations + (name,))
+                queue.append(frames[axes])
+            frame.next[name] = frames[axes]
+    return frames
+
+
+FRAMES = _frames()
+
+
+class FramedPiece:
+    """A live view of a Piece through the frame of a FramedCube"""
+    __slots__ = ('piece', '_cube')
+
+    def __init__(self, piece, framed_cube):
+        self.piece = piece
+        self._cube = framed_cube
+
+    @property
+    def pos(self):
+        p = self.piece.pos
+        (j0, s0), (j1, s1), (j2, s2) = self._cube.frame.axes
+        return Vec3(s0 * p[j0], s1 * p[j1], s2 * p[j2])
+
+    @property
+    def colors(self):
+        colors = self.piece.colors
+        return [colors[j] for j, _ in self._cube.frame.axes]
+
+    @property
+    def type(self):
+        return self.piece.type
+
+    def __str__(self):
+        colors = "".join(c for c in self.colors if c is not None)
+        return f"({self.type}, {colors}, {self.pos})"
+
+
+class FramedCube:
+    """
+    A Cube whose whole-cube rotations (X, Y, Z and their inverses) change the frame it is
+    seen through instead of turning all 26 pieces. Positions, colors and moves are all in
+    the frame.
+    """
+
+    def __init__(self, c):
+        """
+        :param c: The real Cube. Turns are made on it, renamed through the frame.
+        """
+        self.cube = c
+        self.frame = FRAMES[IDENTITY]
+        self._views = {id(p): FramedPiece(p, self) for p in c.pieces}
+
+    @property
+    def pieces(self):
+        return [self._views[id(p)] for p in self.cube.pieces]
+
+    def sequence(self, move_str):
+        """
+        :param move_str: Moves in the frame, as for Cube.sequence()
+        :return: The list of turns made on the real Cube, with no rotations
+        """
+        performed = []
+        for name in parse_moves(move_str):
+            if name in _ROTATIONS:
+                self.frame = self.frame.next[name]
+            else:
+                real = self.frame.moves[name]
+                getattr(self.cube, real)()
+                performed.append(real)
+        return performed
+
+    def materialize(self):
+        """
+        Rotate the real Cube to look like this one, and reset the frame
+        """
+        if self.frame.rotations:
+            self.cube.sequence(" ".join(self.frame.rotations))
+            self.frame = FRAMES[IDENTITY]
+
+    def find_piece(self, *colors):
+        piece = self.cube.find_piece(*colors)
+        return None if piece is None else self._views[id(piece)]
+
+    def get_piece(self, x, y, z):
+        """
+        :return: the Piece at the given Vec3 in the frame
+        """
+        real = [0, 0, 0]
+        for (j, s), v in zip(self.frame.axes, (x, y, z)):
+            real[j] = s * v
+        piece = self.cube.get_piece(*real)
+        return None if piece is None else self._views[id(piece)]
+
+    def __getitem__(self, *args):
+        if len(args) == 1:
+            return self.get_piece(*args[0])
+        return self.get_piece(*args)
+
+    def is_solved(self):
+        return self.cube.is_solved()
+
+    def colors(self):
+        return self.cube.colors()
+
+    def left_color(self): return self[-1, 0, 0].colors[0]
+    def right_color(self): return self[1, 0, 0].colors[0]
+    def up_color(self): return self[0, 1, 0].colors[1]
+    def down_color(self): return self[0, -1, 0].colors[1]
+    def front_color(self): return self[0, 0, 1].colors[2]
+    def back_color(self): return self[0, 0, -1].colors[2]
+
+    def flat_str(self):
+        state = facelets.apply(facelets.to_state(self.cube), self.frame.perm)
+        return state.decode('ascii')
+
+    def __str__(self):
+        return str(Cube(self.flat_str()))
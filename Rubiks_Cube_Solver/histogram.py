@@ -0,0 +1,118 @@
+import math
+
+# Log-linear buckets in the style of HdrHistogram: values below 2^SUB_BITS get a bucket
+# each, and above that every power of two is split into 2^(SUB_BITS-1) equal buckets, so
+# a value is recorded to within 1 / 2^(SUB_BITS-1) of itself in a fixed number of counters.
+SUB_BITS = 8
+MAX_BITS = 40
+_SUB_COUNT = 1 << SUB_BITS
+_HALF = _SUB_COUNT >> 1
+BUCKETS = _SUB_COUNT + (MAX_BITS - SUB_BITS) * _HALF
+
+SUMMARY_PERCENTILES = (50, 90, 99, 99.9)
+
+
+def _index(v):
+    if v < _SUB_COUNT:
+        return v
+    shift = v.bit_length() - SUB_BITS
+    if shift > MAX_BITS - SUB_BITS:
+        return BUCKETS - 1
+    return _SUB_COUNT + (shift - 1) * _HALF + (v >> shift) - _HALF
+
+
+def _highest_value(index):
+    """
+    :return: The largest integer value recorded in the bucket at index
+    """
+    if index < _SUB_COUNT:
+        return index
+    shift, offset = divmod(index - _SUB_COUNT, _HALF)
+    shift += 1
+    return ((offset + _HALF + 1) << shift) - 1
+
+
+class Histogram:
+    def __init__(self, scale=1):
+        """
+        :param scale: Values are recorded as integers in units of 1/scale, e.g. scale=1e6
+            records seconds to the microsecond
+        """
+        self.scale = scale
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value, count=1):
+        if value < 0:
+            raise ValueError(f"Histograms only record non-negative values: {value}")
+        self.counts[_index(int(round(value * self.scale)))] += count
+        self.count += count
+        self.total += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """
+        Add the counts of other, e.g. a histogram from another worker, to this one.
+        """
+        if other.scale != self.scale:
+            raise ValueError(f"Cannot merge histograms with scales {self.scale} and {other.scale}")
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """
+        :param p: Percentile from 0 to 100
+        :return: A value at least as large as p percent of the recorded values, to within
+            the histogram's precision. 0 if the histogram is empty.
+        """
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(self.count * p / 100.0))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(_highest_value(i) / self.scale, self.max)
+        return self.max
+
+    def summary(self):
+        """
+        :return: A dict with the count, mean, p50, p90, p99, p99.9 and max
+        """
+        result = {'count': self.count, 'mean': self.mean()}
+        for p in SUMMARY_PERCENTILES:
+            result[f'p{p:g}'] = self.percentile(p)
+        result['max'] = self.max if self.count else 0.0
+        return result
+
+    def to_dict(self):
+        """
+        :return: A JSON serializable dict, with only the non-empty buckets
+        """
+        return {'scale': self.scale, 'count': self.count, 'total': self.total,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None,
+                'counts': {str(i): c for i, c in enumerate(self.counts) if c}}
+
+    @classmethod
+    def from_dict(cls, d):
+        h = cls(d['scale'])
+        for i, c in d['counts'].items():
+            h.counts[int(i)] = c
+        h.count = d['count']
+        h.total = d['total']
+        if h.count:
+            h.min, h.max = d['min'], d['max']
+        return h
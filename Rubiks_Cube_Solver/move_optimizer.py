@@ -1,4 +1,8 @@
-from Rubiks_Cube_Solver import cube_model
+import collections
+import time
+
+from Rubiks_Cube_Solver import facelets
+from Rubiks_Cube_Solver.short_distance import ShortDistanceTable
 
 X_ROT_CW = {
     'U': 'F',
@@ -50,75 +54,245 @@ def _invert(move):
     return move + 'i'
 
 
-def apply_repeat_three_optimization(moves):
-    """ R, R, R --> Ri """
-    changed = False
-    i = 0
-    while i < len(moves) - 2:
-        if moves[i] == moves[i+1] == moves[i+2]:
-            moves[i:i+3] = [_invert(moves[i])]
-            changed = True
-        else:
-            i += 1
-    if changed:
-        apply_repeat_three_optimization(moves)
-
-
-def apply_do_undo_optimization(moves):
-    """ R Ri --> <nothing>, R R Ri Ri --> <nothing> """
-    changed = False
-    i = 0
-    while i < len(moves) - 1:
-        if _invert(moves[i]) == moves[i+1]:
-            moves[i:i+2] = []
-            changed = True
-        else:
-            i += 1
-    if changed:
-        apply_do_undo_optimization(moves)
+_AXES = {'L': 'x', 'R': 'x', 'M': 'x', 'X': 'x',
+         'U': 'y', 'D': 'y', 'E': 'y', 'Y': 'y',
+         'F': 'z', 'B': 'z', 'S': 'z', 'Z': 'z'}
+
+
+def _quarter_turns(move):
+    """
+    :return: A pair (layer, +1 or -1) for a move like 'R' or 'Ri', or None for other moves
+    """
+    if move in _AXES:
+        return move, 1
+    if len(move) == 2 and move[1] == 'i' and move[0] in _AXES:
+        return move[0], -1
+    return None
+
+
+def _push_turn(stack, move):
+    """Add a move to a stack of runs, where a run is (axis, {layer: count}) or (None, move)"""
+    turns = _quarter_turns(move)
+    if turns is None:
+        stack.append((None, move))
+        return
+    layer, count = turns
+    axis = _AXES[layer]
+    if stack and stack[-1][0] == axis:
+        counts = stack[-1][1]
+        counts[layer] = (counts.get(layer, 0) + count) % 4
+        if not counts[layer]:
+            del counts[layer]
+            if not counts:
+                stack.pop()
+    else:
+        stack.append((axis, {layer: count % 4}))
+
+
+def _run_moves(run):
+    axis, group = run
+    if axis is None:
+        return [group]
+    result = []
+    for layer, count in group.items():
+        result.extend(([layer], [layer, layer], [layer + 'i'])[count - 1])
+    return result
 
 
-def _unrotate(rot, moves):
+def apply_axis_cancellation(moves):
+    """ R L Ri --> L, R R R --> Ri, R Ri --> <nothing>, in a single pass.
+
+    Consecutive moves on the same axis commute, so each run of them is kept on a stack
+    as quarter turn counts (mod 4) per layer. A run whose counts all cancel is popped,
+    which lets the runs on either side of it merge.
+    """
+    stack = []
+    for move in moves:
+        _push_turn(stack, move)
+    moves[:] = [m for run in stack for m in _run_moves(run)]
+
+
+def _unrotate(rot, move):
+    """
+    :return: The move that has the same effect without the rotation `rot` before it
+    """
     rot_table = get_rot_table(rot)
+    if move in rot_table:
+        return rot_table[move]
+    elif _invert(move) in rot_table:
+        return _invert(rot_table[_invert(move)])
+    return move
+
+
+# A frame is one of the 24 cube orientations, stored as the relabeling it applies to each
+# face and slice move (aligned with _FRAME_MOVES).
+_FRAME_MOVES = ('L', 'Li', 'R', 'Ri', 'U', 'Ui', 'D', 'Di', 'F', 'Fi', 'B', 'Bi',
+                'M', 'Mi', 'E', 'Ei', 'S', 'Si')
+_FRAME_INDEX = {move: i for i, move in enumerate(_FRAME_MOVES)}
+_ROTATIONS = {'X', 'Y', 'Z', 'Xi', 'Yi', 'Zi'}
+_next_frames = {}
+
+
+def _rotate_frame(frame, rot):
+    key = (frame, rot)
+    if key not in _next_frames:
+        _next_frames[key] = tuple(frame[_FRAME_INDEX[_unrotate(rot, move)]] for move in _FRAME_MOVES)
+    return _next_frames[key]
+
+
+def apply_no_full_cube_rotation_optimization(moves):
+    """ Z U L D R Zi --> L D R U, and unpaired rotations are removed too: X U --> F
+
+    Tracks the cube's orientation as a frame and relabels every later move through
+    it, in a single pass. The result contains no whole-cube rotations and leaves the
+    cube in the same state up to a final whole-cube rotation.
+    """
+    frame = _FRAME_MOVES
     result = []
     for move in moves:
-        if move in rot_table:
-            result.append(rot_table[move])
-        elif _invert(move) in rot_table:
-            result.append(_invert(rot_table[_invert(move)]))
+        if move in _ROTATIONS:
+            frame = _rotate_frame(frame, move)
+        elif move in _FRAME_INDEX:
+            result.append(frame[_FRAME_INDEX[move]])
         else:
             result.append(move)
-    return result
+    moves[:] = result
 
 
-def apply_no_full_cube_rotation_optimization(moves):
-    rots = {'X', 'Y', 'Z', 'Xi', 'Yi', 'Zi'}
-    changed = False
-    i = 0
-    while i < len(moves):
-        if moves[i] not in rots:
-            i += 1
-            continue
-
-        for j in reversed(range(i + 1, len(moves))):
-            if moves[j] == _invert(moves[i]):
-                moves[i:j+1] = _unrotate(moves[i], moves[i+1:j])
+class MoveStream:
+    """Optimizes moves one at a time as they are produced.
+
+    Whole-cube rotations are removed as in apply_no_full_cube_rotation_optimization() and
+    moves are cancelled as in apply_axis_cancellation(), but only the last `lookbehind`
+    runs of same-axis moves are held back; older runs are final and are emitted.
+    """
+
+    def __init__(self, lookbehind=8, sink=None):
+        """
+        :param lookbehind: Number of runs of same-axis moves held back for cancellation
+        :param sink: An optional callable, called with each move as it is emitted
+        """
+        self.lookbehind = lookbehind
+        self.sink = sink
+        self._frame = _FRAME_MOVES
+        self._stack = collections.deque()
+
+    def _emit(self, moves):
+        if self.sink is not None:
+            for move in moves:
+                self.sink(move)
+        return moves
+
+    def push(self, move):
+        """
+        :return: A list of the moves that became final, possibly empty
+        """
+        if move in _ROTATIONS:
+            self._frame = _rotate_frame(self._frame, move)
+            return []
+        if move in _FRAME_INDEX:
+            move = self._frame[_FRAME_INDEX[move]]
+        _push_turn(self._stack, move)
+        emitted = []
+        while len(self._stack) > self.lookbehind:
+            emitted.extend(_run_moves(self._stack.popleft()))
+        return self._emit(emitted)
+
+    def flush(self):
+        """
+        :return: All moves still held back
+        """
+        emitted = [m for run in self._stack for m in _run_moves(run)]
+        self._stack.clear()
+        return self._emit(emitted)
+
+
+def optimize_stream(moves, lookbehind=8):
+    """
+    :param moves: An iterable of moves, which may be a generator still producing them
+    :return: A generator of optimized moves, yielded as soon as they are final
+    """
+    stream = MoveStream(lookbehind)
+    for move in moves:
+        yield from stream.push(move)
+    yield from stream.flush()
+
+
+_window_tables = {}
+
+
+def _window_table(depth):
+    if depth not in _window_tables:
+        _window_tables[depth] = ShortDistanceTable(depth, facelets.FACE_MOVES + facelets.SLICE_MOVES)
+    return _window_tables[depth]
+
+
+def _best_window(moves, i, window, table):
+    """
+    :return: (end, replacement) for the window starting at i that saves the most moves,
+        or None if no window starting at i can be shortened
+    """
+    best = None
+    state = facelets.SOLVED
+    for j in range(i, min(i + window, len(moves))):
+        if moves[j] in facelets.ROTATIONS or moves[j] not in facelets.MOVE_PERMS:
+            break
+        state = facelets.apply(state, facelets.MOVE_PERMS[moves[j]])
+        dist = table.distance_state(state)
+        if dist is not None and dist < j - i + 1:
+            saving = j - i + 1 - dist
+            if best is None or saving > best[0]:
+                best = (saving, j, state)
+    if best is None:
+        return None
+    _, end, state = best
+    return end, facelets.inverse_sequence(table.lookup_state(state))
+
+
+def apply_window_optimization(moves, window=10, table_depth=4, time_budget=0.5):
+    """
+    Slide a window over the moves and replace each window by an optimal sequence with
+    the same net effect, if one is in the table of sequences up to `table_depth` moves
+    (face and slice turns). Repeats until nothing improves or `time_budget` seconds pass.
+    Windows stop at whole-cube rotations and unknown moves.
+    """
+    table = _window_table(table_depth)
+    deadline = time.time() + time_budget
+    changed = True
+    while changed and time.time() < deadline:
+        changed = False
+        result = []
+        i = 0
+        while i < len(moves):
+            best = _best_window(moves, i, window, table)
+            if best is None:
+                result.append(moves[i])
+                i += 1
+            else:
+                end, replacement = best
+                result.extend(replacement)
+                i = end + 1
                 changed = True
-                break
-        i += 1
-    if changed:
-        apply_no_full_cube_rotation_optimization(moves)
+        moves[:] = result
 
 
-def optimize_moves(moves):
+def optimize_moves(moves, window_budget=None):
+    """
+    :param window_budget: If given, also run apply_window_optimization() for up to this
+        many seconds
+    """
     result = list(moves)
     apply_no_full_cube_rotation_optimization(result)
-    apply_repeat_three_optimization(result)
-    apply_do_undo_optimization(result)
+    apply_axis_cancellation(result)
+    if window_budget:
+        apply_window_optimization(result, time_budget=window_budget)
+        apply_axis_cancellation(result)
     return result
 
 
 if __name__ == '__main__':
+    from Rubiks_Cube_Solver.verify import sequences_equivalent
+
     test_seq_1 = ("Li Li E L Ei Li B Ei R E Ri Z E L Ei Li Zi U U Ui Ui Ui B U B B B Bi "
                   "Ri B R Z U U Ui Ui Ui B U B B B Ri B B R Bi Bi D Bi Di Z Ri B B R Bi "
                   "Bi D Bi Di Z B B Bi Ri B R Z B L Bi Li Bi Di B D B Bi Di B D B L Bi Li "
@@ -136,11 +310,4 @@ if __name__ == '__main__':
     opt = optimize_moves(moves)
     print("{len(opt)} moves: {' '.join(opt)}")
 
-    orig = cube_model.Cube("OOOOOOOOOYYYWWWGGGBBBYYYWWWGGGBBBYYYWWWGGGBBBRRRRRRRRR")
-    c, d = cube_model.Cube(orig), cube_model.Cube(orig)
-
-    c.sequence(" ".join(moves))
-    d.sequence(" ".join(opt))
-    print(c, '\n')
-    print(d)
-    assert c == d
+    assert sequences_equivalent(moves, opt)
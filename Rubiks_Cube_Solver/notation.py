@@ -0,0 +1,125 @@
+import re
+
+# The package's own notation is quarter turns only: R, Ri, M, Mi, X, Xi, ...
+# This module also reads and writes the common extended notation:
+#   R' (prime, same as Ri)   R2 (half turn)   r or Rw (wide: R plus the middle slice)
+#   x y z (whole-cube rotations, same as X Y Z)
+
+_TOKEN = re.compile(r"^([URFDLBMESXYZurfdlbxyz])(w?)(2?)(['i]?)$")
+
+_WIDE = {'R': ('R', 'Mi'), 'L': ('L', 'M'), 'U': ('U', 'Ei'),
+         'D': ('D', 'E'), 'F': ('F', 'S'), 'B': ('B', 'Si')}
+
+# slice moves as two face turns and a whole-cube rotation
+SLICE_AS_FACE_TURNS = {'M': ('R', 'Li', 'Xi'), 'Mi': ('Ri', 'L', 'X'),
+                       'E': ('U', 'Di', 'Yi'), 'Ei': ('Ui', 'D', 'Y'),
+                       'S': ('Fi', 'B', 'Z'), 'Si': ('F', 'Bi', 'Zi')}
+
+_SLICES = set('MES')
+_ROTATIONS = set('XYZ')
+
+_token_cache = {}
+
+
+def _invert(move):
+    return move[:-1] if move.endswith('i') else move + 'i'
+
+
+def _compile_token(token):
+    match = _TOKEN.match(token)
+    if not match:
+        raise ValueError(f"Unknown move: {token}")
+    layer, wide, half, prime = match.groups()
+    if layer in 'xyz':
+        layer = layer.upper()
+    elif layer.islower():
+        layer, wide = layer.upper(), 'w'
+    if wide and layer not in _WIDE:
+        raise ValueError(f"Unknown move: {token}")
+
+    moves = _WIDE[layer] if wide else (layer,)
+    if prime and not half:
+        moves = tuple(_invert(m) for m in moves)
+    if half:
+        moves = moves + moves
+    return moves
+
+
+def expand_token(token):
+    """
+    :param token: One move in extended notation, e.g. "R2", "U'", "r" or "x"
+    :return: A tuple of the equivalent quarter turns in the package's notation
+    """
+    moves = _token_cache.get(token)
+    if moves is None:
+        moves = _token_cache[token] = _compile_token(token)
+    return moves
+
+
+def parse_moves(move_str):
+    """
+    :param move_str: Moves in extended notation separated by whitespace: "R U2 r' x Mi"
+    :return: A list of quarter turns in the package's notation
+    """
+    result = []
+    for token in move_str.split():
+        result.extend(expand_token(token))
+    return result
+
+
+def _runs(moves):
+    """
+    Merge consecutive turns of the same layer.
+    :return: A list of pairs (layer, quarter turns clockwise: 1, 2 or 3)
+    """
+    runs = []
+    for move in moves:
+        layer = move[0]
+        count = -1 if move.endswith('i') else 1
+        if runs and runs[-1][0] == layer:
+            runs[-1][1] += count
+        else:
+            runs.append([layer, count])
+    return [(layer, count % 4) for layer, count in runs if count % 4]
+
+
+def format_moves(moves, half_turns=True, prime=True, expand_slices=False):
+    """
+    :param moves: A list of quarter turns in the package's notation
+    :param half_turns: Write two turns of the same layer as R2 rather than R R
+    :param prime: Write counter-clockwise turns as R' rather than Ri
+    :param expand_slices: Replace slice moves with face turns and a whole-cube rotation
+    :return: A list of moves in extended notation
+    """
+    if expand_slices:
+        moves = [m for move in moves for m in SLICE_AS_FACE_TURNS.get(move, (move,))]
+    result = []
+    for layer, count in _runs(moves):
+        if count == 1:
+            result.append(layer)
+        elif count == 2:
+            result.extend([layer + '2'] if half_turns else [layer, layer])
+        else:
+            result.append(layer + ("'" if prime else 'i'))
+    return result
+
+
+def count_moves(moves):
+    """
+    :param moves: A list of moves in the package's notation or extended notation
+    :return: A dict with the move count in each metric:
+        'htm': half turn metric, any face turn counts 1 and a slice turn counts 2
+        'qtm': quarter turn metric, a half turn counts 2
+        'stm': slice turn metric, any face or slice turn counts 1
+        Whole-cube rotations do not count in any metric.
+    """
+    counts = {'htm': 0, 'qtm': 0, 'stm': 0}
+    for layer, count in _runs(parse_moves(" ".join(moves))):
+        if layer in _ROTATIONS:
+            continue
+        quarters = 2 if count == 2 else 1
+        slice_factor = 2 if layer in _SLICES else 1
+        counts['htm'] += slice_factor
+        counts['qtm'] += quarters * slice_factor
+        counts['stm'] += 1
+    return counts
@@ -0,0 +1,236 @@
+import re
+from operator import itemgetter
+
+from .geometry import Vec3
+from .cube_model import ROT_XY_CW, ROT_XY_CC, ROT_XZ_CW, ROT_XZ_CC, ROT_YZ_CW, ROT_YZ_CC
+
+# An N x N x N cube as a tuple of 6*N*N sticker colors, laid out like Cube's string:
+#
+#             U U U U                   (N rows of N)
+#             U U U U
+#     L L L L F F F F R R R R B B B B   (N rows of 4*N)
+#     ...
+#             D D D D                   (N rows of N)
+#
+# Every move is a precomputed permutation applied with operator.itemgetter, so a turn
+# costs one C-level pass over the stickers however many layers the cube has.
+#
+# Notation: R U F L D B (outer layer), Ri or R' (counter-clockwise), R2 (half turn),
+# 3R (third layer only), Rw or r (two outer layers), 3Rw (three outer layers),
+# M E S (middle layer, odd N only), X Y Z (whole cube).
+
+# axis index, outward sign and clockwise rotation of each face
+_FACES = {
+    'R': (0, 1, ROT_YZ_CW), 'L': (0, -1, ROT_YZ_CC),
+    'U': (1, 1, ROT_XZ_CW), 'D': (1, -1, ROT_XZ_CC),
+    'F': (2, 1, ROT_XY_CW), 'B': (2, -1, ROT_XY_CC),
+}
+# slices turn like the face named here, rotations like the whole cube turned with it
+_SLICES = {'M': 'L', 'E': 'D', 'S': 'F'}
+_ROTATIONS = {'X': 'R', 'Y': 'U', 'Z': 'F'}
+
+_TOKEN = re.compile(r"^(\d*)([URFDLBMESXYZurfdlbxyz])(w?)(2?)(['i]?)$")
+
+
+# axis index, outward sign and sort key of each face's stickers in string order
+_FACE_ORDER = {
+    'U': (1, 1, lambda p: (p[2], p[0])),
+    'L': (0, -1, lambda p: (-p[1], p[2])),
+    'F': (2, 1, lambda p: (-p[1], p[0])),
+    'R': (0, 1, lambda p: (-p[1], -p[2])),
+    'B': (2, -1, lambda p: (-p[1], -p[0])),
+    'D': (1, -1, lambda p: (-p[2], p[0])),
+}
+
+
+class _Layout:
+    """
+    The stickers of an N x N x N cube and the permutations of its moves. Piece positions
+    use doubled coordinates, -(N-1), -(N-3), ..., N-1, so they stay integers for even N.
+    """
+
+    def __init__(self, n):
+        if n < 2:
+            raise ValueError(f"Cube size must be at least 2, not {n}")
+        self.n = n
+        coords = range(-(n - 1), n, 2)
+        faces = {}
+        for face, (axis, sign, key) in _FACE_ORDER.items():
+            positions = []
+            for a in coords:
+                for b in coords:
+                    pos = [a, b]
+                    pos.insert(axis, sign * (n - 1))
+                    positions.append(tuple(pos))
+            normal = [0, 0, 0]
+            normal[axis] = sign
+            faces[face] = [(pos, tuple(normal)) for pos in sorted(positions, key=key)]
+
+        rows = [faces['U'][r * n:(r + 1) * n] for r in range(n)]
+        for r in range(n):
+            rows.append([s for face in 'LFRB' for s in faces[face][r * n:(r + 1) * n]])
+        rows += [faces['D'][r * n:(r + 1) * n] for r in range(n)]
+        self.stickers = tuple(s for row in rows for s in row)
+        self.index = {s: i for i, s in enumerate(self.stickers)}
+        self.faces = {face: tuple(self.index[s] for s in stickers) for face, stickers in faces.items()}
+        solved = [None] * len(self.stickers)
+        for face, indices in self.faces.items():
+            for i in indices:
+                solved[i] = face
+        self.solved = tuple(solved)
+        self._layers = {}
+        self._getters = {}
+
+    def layer_perm(self, face, depth):
+        """
+        :param depth: 1 for the outer layer of face, up to n for the opposite outer layer
+        :return: The permutation (a tuple, new[i] = old[perm[i]]) of a clockwise quarter turn
+            of that single layer, as seen from face
+        """
+        key = face, depth
+        perm = self._layers.get(key)
+        if perm is None:
+            axis, sign, matrix = _FACES[face]
+            coord = sign * (self.n + 1 - 2 * depth)
+            perm = list(range(len(self.stickers)))
+            for i, (pos, normal) in enumerate(self.stickers):
+                if pos[axis] == coord:
+                    target = (tuple(matrix * Vec3(pos)), tuple(matrix * Vec3(normal)))
+                    perm[self.index[target]] = i
+            perm = self._layers[key] = tuple(perm)
+        return perm
+
+    def token_perm(self, token):
+        """
+        :return: The permutation of one move in the notation above
+        """
+        match = _TOKEN.match(token)
+        if not match:
+            raise ValueError(f"Unknown move: {token}")
+        prefix, layer, wide, half, prime = match.groups()
+        if layer in 'xyz':
+            layer = layer.upper()
+        elif layer.islower():
+            layer, wide = layer.upper(), 'w'
+        n = self.n
+
+        if layer in _ROTATIONS:
+            if prefix or wide:
+                raise ValueError(f"Unknown move: {token}")
+            face, depths = _ROTATIONS[layer], range(1, n + 1)
+        elif layer in _SLICES:
+            if prefix or wide or n % 2 == 0:
+                raise ValueError(f"Unknown move for a {n}x{n} cube: {token}")
+            face, depths = _SLICES[layer], (n // 2 + 1,)
+        else:
+            k = int(prefix) if prefix else (2 if wide else 1)
+            if not 1 <= k <= n:
+                raise ValueError(f"Unknown move for a {n}x{n} cube: {token}")
+            face, depths = layer, (range(1, k + 1) if wide else (k,))
+
+        quarter = compose(*(self.layer_perm(face, d) for d in depths))
+        turns = 2 if half else (3 if prime else 1)
+        return compose(*([quarter] * turns))
+
+    def getter(self, token):
+        getter = self._getters.get(token)
+        if getter is None:
+            getter = self._getters[token] = itemgetter(*self.token_perm(token))
+        return getter
+
+
+_layouts = {}
+
+
+def layout(n):
+    """
+    :return: The (cached) sticker layout and move permutations of the n x n x n cube
+    """
+    result = _layouts.get(n)
+    if result is None:
+        result = _layouts[n] = _Layout(n)
+    return result
+
+
+def compose(*perms):
+    """
+    :return: The permutation of applying perms in order
+    """
+    result = perms[0]
+    for perm in perms[1:]:
+        result = tuple(result[i] for i in perm)
+    return result
+
+
+def move_perm(n, token):
+    """
+    :return: The sticker permutation of one move on the n x n x n cube, e.g. "3Rw'"
+    """
+    return layout(n).token_perm(token)
+
+
+class NxNCube:
+
+    def __init__(self, n, cube_str=None):
+        """
+        :param n: Number of layers along each edge
+        :param cube_str: The stickers unfolded as for Cube: N rows of U, N rows of L F R B,
+            N rows of D. Whitespace is ignored. A solved cube with stickers named after
+            their faces if not given.
+        """
+        self.n = n
+        self._layout = layout(n)
+        if cube_str is None:
+            self.state = self._layout.solved
+            return
+        if isinstance(cube_str, NxNCube):
+            self.state = cube_str.state
+            return
+        stickers = "".join(cube_str.split())
+        if len(stickers) != 6 * n * n:
+            raise ValueError(f"A {n}x{n} cube has {6 * n * n} stickers, not {len(stickers)}")
+        self.state = tuple(stickers)
+
+    def sequence(self, move_str):
+        """
+        :param move_str: Moves separated by whitespace: "R 2Rw' U2 3F x"
+        """
+        getter = self._layout.getter
+        getters = [getter(token) for token in move_str.split()]
+        state = self.state
+        for get in getters:
+            state = get(state)
+        self.state = state
+
+    def face(self, face):
+        """
+        :param face: One of 'U', 'L', 'F', 'R', 'B', 'D'
+        :return: A tuple of the face's sticker colors, in string order
+        """
+        return tuple(self.state[i] for i in self._layout.faces[face])
+
+    def is_solved(self):
+        return all(len(set(self.face(face))) == 1 for face in 'ULFRBD')
+
+    def __eq__(self, other):
+        return isinstance(other, NxNCube) and self.n == other.n and self.state == other.state
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __hash__(self):
+        return hash((self.n, self.state))
+
+    def flat_str(self):
+        return "".join(self.state)
+
+    def __str__(self):
+        n, s = self.n, self.flat_str()
+        indent = " " * (n + 1)
+        lines = [indent + s[r * n:(r + 1) * n] for r in range(n)]
+        middle = s[n * n:5 * n * n]
+        for r in range(n):
+            row = middle[r * 4 * n:(r + 1) * 4 * n]
+            lines.append(" ".join(row[f * n:(f + 1) * n] for f in range(4)))
+        lines += [indent + s[5 * n * n + r * n:5 * n * n + (r + 1) * n] for r in range(n)]
+        return "\n".join(lines)
@@ -0,0 +1,105 @@
+import itertools
+
+from . import coordinates
+from . import facelets
+from .search import CoordinateTable
+
+# After the front cross the Solver fills four slots, each a front corner and the middle
+# layer edge next to it: FUL + UL, FUR + UR, FDL + DL and FDR + DR. A pair's coordinate
+# is where the front sticker of its corner and the first sticker of its edge are, one of
+# 24 * 24. Pairs are moved with macros that keep the cross and the already filled slots:
+#   B, B2, Bi                      (the back layer plays the role of the top layer)
+#   f B^k f^-1 for a side face f   (an insertion trigger, 3 moves)
+# A search.CoordinateTable of the cheapest macro sequences is built for every slot and
+# every set of already filled slots, and the cheapest order of the four slots is chosen
+# by simulating all 24 orders.
+
+SLOTS = (('U', 'L'), ('U', 'R'), ('D', 'L'), ('D', 'R'))
+
+
+def _pieces(slot):
+    x, y = slot
+    return 'F' + x + y, x + y
+
+
+def _home(slot):
+    corner, edge = _pieces(slot)
+    return coordinates.find_piece(facelets.SOLVED, corner), coordinates.find_piece(facelets.SOLVED, edge)
+
+
+# sticker indices of each slot's corner (front sticker first) and edge, when solved
+_HOMES = {slot: _home(slot) for slot in SLOTS}
+_CROSS = [i for piece in coordinates.EDGES if any(facelets.SOLVED[i] == ord('F') for i in piece)
+          for i in piece]
+
+
+def _macros():
+    """
+    :return: A list of (quarter turns, cost in half turn metric moves, permutation)
+    """
+    back = (['B'], ['B', 'B'], ['Bi'])
+    macros = [(turns, 1) for turns in back]
+    for f in ('U', 'Ui', 'L', 'Li', 'R', 'Ri', 'D', 'Di'):
+        undo = f[:-1] if f.endswith('i') else f + 'i'
+        macros += [([f] + turns + [undo], 3) for turns in back]
+    return [(turns, cost, facelets.sequence_perm(turns)) for turns, cost in macros]
+
+
+MACROS = _macros()
+
+
+def _pair_ranks(state, slot):
+    """
+    :return: The coordinate (corner rank, edge rank) of the slot's pair in a state whose
+        stickers are named after their faces, or None if its pieces are missing
+    """
+    corner, edge = (coordinates.find_piece(state, colors) for colors in _pieces(slot))
+    if corner is None or edge is None:
+        return None
+    return coordinates.CORNER_RANK[corner[0]], coordinates.EDGE_RANK[edge[0]]
+
+
+_tables = {}
+
+
+def table(slot, filled):
+    """
+    :param filled: The slots already filled, which the macros must keep
+    :return: The (lazily built) CoordinateTable of the slot's pair
+    """
+    key = slot, frozenset(filled)
+    result = _tables.get(key)
+    if result is None:
+        keep = list(_CROSS)
+        for other in filled:
+            corner, edge = _HOMES[other]
+            keep += corner + edge
+        macros = [macro for macro in MACROS if all(macro[2][i] == i for i in keep)]
+        goal = _pair_ranks(facelets.SOLVED, slot)
+        result = _tables[key] = CoordinateTable(goal, (coordinates.CORNER, coordinates.EDGE), macros)
+    return result
+
+
+def solve_pairs(state):
+    """
+    :param state: A state whose stickers are named after their faces, with the front cross
+        solved
+    :return: The list of quarter turns of the cheapest slot order that fills all four
+        slots, or None if some pair cannot be placed with the macros
+    """
+    best = None
+    for order in itertools.permutations(SLOTS):
+        current, cost, moves = state, 0, []
+        for n, slot in enumerate(order):
+            ranks = _pair_ranks(current, slot)
+            pair_table = table(slot, order[:n])
+            path = None if ranks is None else pair_table.path(ranks)
+            if path is None:
+                break
+            cost += pair_table.distance(ranks)
+            moves += path
+            current = facelets.apply(current, facelets.sequence_perm(path))
+        else:
+            if best is None or cost < best[0]:
+                best = cost, moves
+    return None if best is None else best[1]
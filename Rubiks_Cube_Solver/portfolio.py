@@ -0,0 +1,73 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from . import facelets
+from .cube_model import Cube
+from .cube_solver import Solver, build_tables
+from .move_optimizer import optimize_moves
+from .symmetry import symmetries, rotation_moves
+
+_ROTATIONS = symmetries(mirrors=False)
+
+# moves: the shortest optimized solution, in the original cube's frame.
+# orientation: index of the whole-cube rotation it was found in (0 is the identity).
+# inverse: True if it was found by solving the inverse scramble.
+PortfolioResult = namedtuple('PortfolioResult', 'moves orientation inverse')
+
+
+def _solve_candidate(task):
+    """
+    Solve one orientation of the cube (or of its inverse). Candidates are not cut off
+    mid-solve: optimize_moves cancels moves across phase boundaries, so the optimized
+    length of a partial solution is no lower bound on that of the complete one.
+    :return: A pair (task, optimized moves), or (task, None) if the Solver left it unsolved
+    """
+    state, orientation, inverse = task
+    transform = _ROTATIONS[orientation]
+    c = Cube(transform.apply(state).decode('ascii'))
+    solver = Solver(c)
+    solver.solve()
+    if not c.is_solved():
+        return task, None
+
+    moves = transform.to_original(solver.moves)
+    if inverse:
+        # the solution of the inverse scramble, undone, solves the cube. The inverse may
+        # have ended up solved in another orientation, so restore that rotation first.
+        rotation = facelets.compose(facelets.state_perm(state), facelets.sequence_perm(moves))
+        moves = rotation_moves(rotation) + facelets.inverse_sequence(moves)
+
+    return task, optimize_moves(moves)
+
+
+def solve_portfolio(cube, workers=None, include_inverse=True):
+    """
+    Run the Solver and optimize_moves on all 24 whole-cube orientations of the cube (and
+    of its inverse scramble) in parallel and keep the shortest solution.
+    :param cube: A Cube or cube string. It is not modified.
+    :param workers: Number of worker processes (default: one per CPU), 1 to run in-process
+    :return: A PortfolioResult whose moves solve the cube as given
+    :raises Exception: If the Solver fails, e.g. on an unsolvable cube
+    """
+    state = facelets.to_state(cube)
+    tasks = [(state, i, False) for i in range(len(_ROTATIONS))]
+    if include_inverse:
+        relabeled, _ = facelets.relabel(state)
+        inverse_state = facelets.apply(facelets.SOLVED, facelets.invert(facelets.state_perm(relabeled)))
+        tasks += [(inverse_state, i, True) for i in range(len(_ROTATIONS))]
+
+    if workers == 1:
+        return _pick(map(_solve_candidate, tasks))
+    build_tables()
+    with ProcessPoolExecutor(workers, initializer=build_tables) as pool:
+        return _pick(pool.map(_solve_candidate, tasks))
+
+
+def _pick(results):
+    best = None
+    for (_, orientation, inverse), moves in results:
+        if moves is not None and (best is None or len(moves) < len(best.moves)):
+            best = PortfolioResult(moves, orientation, inverse)
+    if best is None:
+        raise Exception("Portfolio failed to solve cube - unsolvable cube?")
+    return best
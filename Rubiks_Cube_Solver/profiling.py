@@ -0,0 +1,212 @@
+import cProfile
+import collections
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+from . import cross_table
+from . import pair_table
+from .cube_model import Cube, Piece
+from .cube_solver import Solver
+from .geometry import Matrix
+
+# Solver methods that are not phases but still run: the fallbacks of the table phases
+_FALLBACKS = ('cross_by_pieces', 'cross_corners', 'second_layer')
+
+
+def _focus_functions():
+    functions = {
+        'Piece.rotate': Piece.rotate,
+        'Matrix.__mul__': Matrix.__mul__,
+        'Cube._face': Cube._face,
+        'Cube.find_piece': Cube.find_piece,
+        'cross_table.solve_cross': cross_table.solve_cross,
+        'pair_table.solve_pairs': pair_table.solve_pairs,
+    }
+    for name in Solver.PHASES + _FALLBACKS:
+        functions['Solver.' + name] = getattr(Solver, name)
+    return {label: f.__code__ for label, f in functions.items()}
+
+
+# the hot spots we keep investigating, every Solver phase and its fallbacks, and the
+# table lookups the phases use: label -> code object
+FOCUS = _focus_functions()
+
+
+def _frame_label(code):
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{os.path.basename(code.co_filename)}:{name}"
+
+
+def _line_range(code):
+    lines = [line for _, _, line in code.co_lines() if line is not None]
+    return code.co_filename, min(lines), max(lines)
+
+
+class Profile:
+    """
+    The results of a profile_solves() block:
+        stats: pstats.Stats of the cProfile run
+        time_stacks: Counter of sampled call stacks, collapsed as "a;b;c", root first
+        alloc_stacks: Counter of live bytes in tracemalloc snapshots by collapsed stack
+        samples, snapshots: How many stack samples and memory snapshots were taken
+    """
+
+    def __init__(self):
+        self.stats = None
+        self.time_stacks = collections.Counter()
+        self.alloc_stacks = collections.Counter()
+        self.samples = 0
+        self.snapshots = 0
+
+    def focus_table(self):
+        """
+        :return: A list of rows (label, calls, own seconds, cumulative seconds, percent of
+            samples inside it, average live KiB allocated inside it) for every FOCUS function
+        """
+        by_code = {}
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in self.stats.stats.items():
+            by_code[filename, line, name] = calls, tottime, cumtime
+        rows = []
+        for label, code in FOCUS.items():
+            calls, tottime, cumtime = by_code.get((code.co_filename, code.co_firstlineno, code.co_name), (0, 0.0, 0.0))
+            frame = _frame_label(code)
+            sampled = sum(n for stack, n in self.time_stacks.items() if frame in stack.split(';'))
+            live = sum(n for stack, n in self.alloc_stacks.items() if frame in stack.split(';'))
+            rows.append((label, calls, tottime, cumtime,
+                         100.0 * sampled / max(self.samples, 1), live / 1024.0 / max(self.snapshots, 1)))
+        return rows
+
+    def report(self, top=15):
+        """
+        :return: The FOCUS table followed by the top functions by own time, as text
+        """
+        lines = [f"{'function':<40} {'calls':>10} {'own s':>9} {'cum s':>9} {'sampled':>8} {'live KiB':>9}"]
+        for label, calls, tottime, cumtime, sampled, live in self.focus_table():
+            lines.append(f"{label:<40} {calls:>10} {tottime:>9.3f} {cumtime:>9.3f} {sampled:>7.1f}% {live:>9.1f}")
+        lines.append("")
+        lines.append(f"Top {top} functions by own time")
+        lines.append(f"{'function':<60} {'calls':>10} {'own s':>9} {'cum s':>9}")
+        entries = sorted(self.stats.stats.items(), key=lambda item: -item[1][2])[:top]
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in entries:
+            label = f"{os.path.basename(filename)}:{line}({name})"
+            lines.append(f"{label:<60} {calls:>10} {tottime:>9.3f} {cumtime:>9.3f}")
+        return "\n".join(lines)
+
+    def save(self, directory):
+        """
+        Write time.collapsed and alloc.collapsed (flamegraph.pl / speedscope input) and the
+        cProfile stats as profile.pstats to directory.
+        :return: The list of files written
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for name, stacks in (('time.collapsed', self.time_stacks), ('alloc.collapsed', self.alloc_stacks)):
+            path = os.path.join(directory, name)
+            with open(path, "w") as f:
+                for stack, n in stacks.most_common():
+                    f.write(f"{stack} {n}\n")
+            paths.append(path)
+        path = os.path.join(directory, 'profile.pstats')
+        self.stats.dump_stats(path)
+        paths.append(path)
+        return paths
+
+
+def _collapse(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def _collapse_traceback(traceback, labels):
+    return ";".join(labels.get(frame.filename, frame.lineno) for frame in traceback)  # oldest first
+
+
+def _sampler(profile, thread_id, stop, interval, snapshot_every):
+    labels = _LineLabels()
+    n = 0
+    while not stop.wait(interval):
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            continue
+        profile.time_stacks[_collapse(frame)] += 1
+        profile.samples += 1
+        n += 1
+        if snapshot_every and n % snapshot_every == 0 and tracemalloc.is_tracing():
+            # leave out the sampler's own allocations
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, __file__, all_frames=True)])
+            for stat in snapshot.statistics('traceback'):
+                profile.alloc_stacks[_collapse_traceback(stat.traceback, labels)] += stat.size
+            profile.snapshots += 1
+
+
+class _LineLabels:
+    """
+    Names the frames of tracemalloc tracebacks, which only have a file name and a line
+    number, after the function around the line. Files are indexed as they are first seen.
+    """
+
+    def __init__(self):
+        self.labels = {}
+        self.files = set()
+
+    def _index_file(self, filename):
+        self.files.add(filename)
+        for module in list(sys.modules.values()):
+            if getattr(module, '__file__', None) != filename:
+                continue
+            for value in vars(module).values():
+                for f in (vars(value).values() if isinstance(value, type) else (value,)):
+                    code = getattr(f, '__code__', None)
+                    if code is not None and code.co_filename == filename:
+                        _, first, last = _line_range(code)
+                        for line in range(first, last + 1):
+                            self.labels.setdefault((filename, line), _frame_label(code))
+
+    def get(self, filename, line):
+        if filename not in self.files:
+            self._index_file(filename)
+        return self.labels.get((filename, line), f"{os.path.basename(filename)}:{line}")
+
+
+@contextmanager
+def profile_solves(interval=0.002, snapshot_every=100, trace_frames=16):
+    """
+    Profile the code run in the block with cProfile, a stack sampler and tracemalloc:
+
+        with profile_solves() as profile:
+            Solver(cube).solve()
+        print(profile.report())
+        profile.save("profile")
+
+    :param interval: Seconds between stack samples
+    :param snapshot_every: Take a tracemalloc snapshot every this many samples (0: never).
+        Live allocations are attributed to every frame of their traceback.
+    :param trace_frames: Frames of traceback tracemalloc stores for each allocation
+    :return: A Profile, complete once the block exits
+    """
+    profile = Profile()
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sampler, daemon=True,
+                               args=(profile, threading.get_ident(), stop, interval, snapshot_every))
+    started_tracemalloc = snapshot_every and not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(trace_frames)
+    profiler = cProfile.Profile()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield profile
+    finally:
+        profiler.disable()
+        stop.set()
+        sampler.join()
+        if started_tracemalloc:
+            tracemalloc.stop()
+        profile.stats = pstats.Stats(profiler)
@@ -0,0 +1,320 @@
+import heapq
+import itertools
+import math
+import time
+
+from . import coordinates
+from . import facelets
+
+# opposite faces; of two turns of the same axis only the order listed here is searched
+_AXES = (('U', 'D'), ('L', 'R'), ('F', 'B'))
+
+
+def htm_moves(faces='ULFRBD'):
+    """
+    :return: A dict move -> sticker permutation of the half turn metric moves of faces,
+        in the package's quarter turn names: 'R', 'R R' and 'Ri' for each face
+    """
+    moves = {}
+    for face in faces:
+        perm = facelets.MOVE_PERMS[face]
+        moves[face] = perm
+        moves[face + ' ' + face] = facelets.compose(perm, perm)
+        moves[face + 'i'] = facelets.MOVE_PERMS[face + 'i']
+    return moves
+
+
+def _quarter_turns(path):
+    return [turn for move in path for turn in move.split()]
+
+
+HTM_MOVES = htm_moves()
+
+
+def _canonical_successors(moves):
+    """
+    Canonical sequence pruning: never turn the same face twice in a row, and turn two
+    opposite faces in one order only, since they commute. This cuts the branching factor
+    of the 18 half turn metric moves to about 13.35.
+    :return: A dict previous face (None at the start) -> list of (name, face, perm)
+    """
+    first_of_axis = {b: a for a, b in _AXES}
+    faces = {name[0] for name in moves}
+    result = {}
+    for prev in [None] + sorted(faces):
+        allowed = []
+        for name, perm in moves.items():
+            face = name[0]
+            if prev is not None and (face == prev or first_of_axis.get(prev) == face):
+                continue
+            allowed.append((name, face, perm))
+        result[prev] = allowed
+    return result
+
+
+def zero_heuristic(state):
+    return 0
+
+
+def distance_table_heuristic(table, quarter_turns_per_move=2):
+    """
+    :param table: A ShortDistanceTable
+    :param quarter_turns_per_move: The most of the table's moves one search move can be
+        worth, 2 for a table of quarter turns and a search in the half turn metric
+    :return: An admissible heuristic: the stored distance, or a lower bound for states
+        beyond the table's depth
+    """
+    beyond = math.ceil((table.depth + 1) / quarter_turns_per_move)
+
+    def heuristic(state):
+        distance = table.distance_state(state)
+        return beyond if distance is None else math.ceil(distance / quarter_turns_per_move)
+    return heuristic
+
+
+class Search:
+    """
+    IDA* and A* over 54 byte states (see facelets) with a pluggable goal test and
+    heuristic, canonical move pruning and a transposition table.
+    """
+
+    def __init__(self, is_goal=facelets.is_solved, heuristic=zero_heuristic, moves=HTM_MOVES,
+                 max_table_size=1 << 20):
+        """
+        :param is_goal: A callable, given a state, returning True for goal states
+        :param heuristic: A callable, given a state, returning a lower bound on its number
+            of moves from a goal state. It must be admissible for solutions to be optimal.
+        :param moves: A dict move -> sticker permutation. A move is one or more quarter
+            turns separated by spaces, all of the face named by its first letter, for
+            canonical pruning.
+        :param max_table_size: Most entries kept in the transposition table
+        """
+        self.is_goal = is_goal
+        self.heuristic = heuristic
+        self.moves = moves
+        self.max_table_size = max_table_size
+        self._successors = _canonical_successors(moves)
+        self._table = {}
+        self.nodes = 0
+        self.elapsed = 0.0
+
+    def nodes_per_second(self):
+        return self.nodes / self.elapsed if self.elapsed else 0.0
+
+    def _start(self, start):
+        state = facelets.to_state(start.state if hasattr(start, 'state') else start)
+        return facelets.relabel(state)[0]
+
+    def ida_star(self, start, max_depth=20):
+        """
+        :param start: A Cube, cube string, state or CubeState. Stickers are renamed after
+            the face of the center with the same color before searching.
+        :return: A list of quarter turns (e.g. 'R', 'Ri', a half turn as 'R', 'R') making
+            a shortest sequence of moves to a goal, or None if there is none within
+            max_depth moves
+        """
+        state = self._start(start)
+        self.nodes = 0
+        begin = time.perf_counter()
+        try:
+            bound = self.heuristic(state)
+            path = []
+            while bound <= max_depth:
+                self._table.clear()
+                result = self._dfs(state, 0, bound, None, path)
+                if result is True:
+                    return _quarter_turns(path)
+                if result == math.inf:
+                    return None
+                bound = result
+            return None
+        finally:
+            self.elapsed = time.perf_counter() - begin
+            self._table.clear()
+
+    def _dfs(self, state, g, bound, prev, path):
+        """
+        :return: True if a goal was found (path holds the moves), else the smallest f
+            above bound seen below this node
+        """
+        self.nodes += 1
+        f = g + self.heuristic(state)
+        if f > bound:
+            return f
+        if self.is_goal(state):
+            return True
+
+        # a state already searched at the same or a lower depth in this iteration, after
+        # a move of the same face, has nothing new below it
+        key = (state, prev)
+        seen = self._table.get(key)
+        if seen is not None and seen <= g:
+            return math.inf
+        if seen is not None or len(self._table) < self.max_table_size:
+            self._table[key] = g
+
+        smallest = math.inf
+        for name, face, perm in self._successors[prev]:
+            path.append(name)
+            result = self._dfs(facelets.apply(state, perm), g + 1, bound, face, path)
+            if result is True:
+                return True
+            path.pop()
+            smallest = min(smallest, result)
+        return smallest
+
+    def a_star(self, start, max_nodes=None):
+        """
+        :param start: As for ida_star()
+        :param max_nodes: Give up after expanding this many nodes
+        :return: As for ida_star(), or None if there is no goal (or max_nodes was reached)
+        """
+        state = self._start(start)
+        self.nodes = 0
+        begin = time.perf_counter()
+        counter = itertools.count()
+        # (state, previous face) -> (g, parent key, move)
+        parents = {(state, None): (0, None, None)}
+        heap = [(self.heuristic(state), next(counter), 0, state, None)]
+        try:
+            while heap:
+                _, _, g, current, prev = heapq.heappop(heap)
+                key = (current, prev)
+                if parents[key][0] < g:
+                    continue
+                self.nodes += 1
+                if self.is_goal(current):
+                    return self._path(parents, key)
+                if max_nodes is not None and self.nodes >= max_nodes:
+                    return None
+                for name, face, perm in self._successors[prev]:
+                    child = facelets.apply(current, perm)
+                    child_key = (child, face)
+                    known = parents.get(child_key)
+                    if known is not None and known[0] <= g + 1:
+                        continue
+                    parents[child_key] = (g + 1, key, name)
+                    heapq.heappush(heap, (g + 1 + self.heuristic(child), next(counter), g + 1, child, face))
+            return None
+        finally:
+            self.elapsed = time.perf_counter() - begin
+
+    @staticmethod
+    def _path(parents, key):
+        moves = []
+        while True:
+            _, parent, move = parents[key]
+            if parent is None:
+                return _quarter_turns(moves[::-1])
+            moves.append(move)
+            key = parent
+
+
+class CoordinateTable:
+    """
+    The distance to a goal of every coordinate reachable from it, where a coordinate is
+    a tuple of sticker ranks of up to four pieces (see coordinates). Built by a
+    breadth-first search over cost buckets, which is Dijkstra's algorithm for small
+    integer costs, into a bytearray indexed by the ranks in base 24. Shortest move
+    sequences are read off it.
+    """
+    UNSEEN = 255
+
+    def __init__(self, goal, kinds, moves):
+        """
+        :param goal: The goal coordinate
+        :param kinds: For each rank of a coordinate, coordinates.CORNER or coordinates.EDGE
+        :param moves: A list of (quarter turns, cost, sticker permutation). It must hold
+            the inverse of every move at the same cost, so that distances from the goal
+            are distances to it.
+        """
+        assert len(goal) == len(kinds) <= 4
+        self.size = len(goal)
+        # an index splits into a high and a low part of up to two ranks each; each move
+        # maps both through a table, and the moved index is the sum of the two
+        self._low_size = 24 ** min(self.size, 2)
+        self.moves = []
+        for turns, cost, perm in moves:
+            destinations = coordinates.rank_destinations(perm)
+            destinations = [destinations[kind] for kind in kinds]
+            split = self.size - min(self.size, 2)
+            high = self._part_table(destinations[:split], self._low_size)
+            low = self._part_table(destinations[split:], 1)
+            self.moves.append((turns, cost, high, low))
+        self.goal = self.index(goal)
+        self.distances = self._build()
+
+    @staticmethod
+    def _part_table(destinations, scale):
+        """
+        :return: For every index of the ranks of a part, the index they move to, times scale
+        """
+        table = [0]
+        for dests in destinations:
+            table = [t * 24 + d for t in table for d in dests]
+        return [t * scale for t in table]
+
+    def index(self, coord):
+        i = 0
+        for rank in coord:
+            i = i * 24 + rank
+        return i
+
+    def _moved(self, i, high, low):
+        hi, lo = divmod(i, self._low_size)
+        return high[hi] + low[lo]
+
+    def _build(self):
+        distances = bytearray([self.UNSEEN]) * (24 ** self.size)
+        distances[self.goal] = 0
+        steps = [(cost, high, low) for _, cost, high, low in self.moves]
+        low_size = self._low_size
+        buckets = [[self.goal]]
+        dist = 0
+        while dist < len(buckets):
+            for i in buckets[dist]:
+                if distances[i] != dist:
+                    continue
+                hi, lo = divmod(i, low_size)
+                for cost, high, low in steps:
+                    child = high[hi] + low[lo]
+                    if dist + cost < distances[child]:
+                        distances[child] = dist + cost
+                        while len(buckets) <= dist + cost:
+                            buckets.append([])
+                        buckets[dist + cost].append(child)
+            buckets[dist] = None
+            dist += 1
+        assert dist < self.UNSEEN
+        return distances
+
+    def distance(self, coord):
+        """
+        :return: The cost of a cheapest move sequence from coord to the goal, or None if
+            the goal cannot be reached
+        """
+        dist = self.distances[self.index(coord)]
+        return None if dist == self.UNSEEN else dist
+
+    def path(self, coord):
+        """
+        :return: The quarter turns of a cheapest move sequence from coord to the goal, or
+            None if the goal cannot be reached
+        """
+        dist = self.distance(coord)
+        if dist is None:
+            return None
+        i = self.index(coord)
+        turns = []
+        while dist:
+            for move_turns, cost, high, low in self.moves:
+                child = self._moved(i, high, low)
+                if self.distances[child] == dist - cost:
+                    turns += move_turns
+                    i, dist = child, dist - cost
+                    break
+        return turns
+
+    def __len__(self):
+        """The number of coordinates that can reach the goal"""
+        return len(self.distances) - self.distances.count(self.UNSEEN)
@@ -0,0 +1,130 @@
+from . import facelets
+from .facelets import SOLVED
+
+_MOVE_BITS = 5
+_MOVE_MASK = (1 << _MOVE_BITS) - 1
+
+
+class ShortDistanceTable:
+    """Every state within `depth` moves of solved, keyed by its 54 byte state.
+
+    The key is the state itself rather than a packed piece coordinate: the move optimizer
+    builds tables over slice moves, which move the centers, and packing a state costs more
+    per search node than the hash of 54 bytes.
+
+    Each entry stores the distance to solved and the move that takes the state one step
+    closer, so a solution is read off with a handful of lookups. Cubes further away are
+    solved optimally (up to about 2 * depth moves) with a meet-in-the-middle search.
+    """
+
+    def __init__(self, depth=5, moves=facelets.FACE_MOVES):
+        """
+        :param depth: Maximum distance from solved of the stored states
+        :param moves: The move set, which must contain the inverse of every move
+        """
+        assert len(moves) <= _MOVE_MASK
+        self.depth = depth
+        self.moves = tuple(moves)
+        self._perms = [facelets.MOVE_PERMS[m] for m in self.moves]
+        perm_index = {perm: i for i, perm in enumerate(self._perms)}
+        self._undo = [perm_index[facelets.invert(perm)] for perm in self._perms]
+        self.table = {SOLVED: 0}
+        self._build()
+
+    def __len__(self):
+        return len(self.table)
+
+    def _build(self):
+        frontier = [SOLVED]
+        for dist in range(1, self.depth + 1):
+            next_frontier = []
+            for state in frontier:
+                for i, perm in enumerate(self._perms):
+                    child = facelets.apply(state, perm)
+                    if child not in self.table:
+                        self.table[child] = (dist << _MOVE_BITS) | self._undo[i]
+                        next_frontier.append(child)
+            frontier = next_frontier
+
+    def _state(self, cube):
+        return facelets.relabel(facelets.to_state(cube))[0]
+
+    def distance(self, cube):
+        """
+        :return: The number of moves needed to solve the cube, or None if it is not stored
+        """
+        return self.distance_state(self._state(cube))
+
+    def distance_state(self, state):
+        """Like distance(), for a state whose stickers are already named after their faces"""
+        entry = self.table.get(state)
+        return None if entry is None else entry >> _MOVE_BITS
+
+    def _path_to_solved(self, state):
+        moves = []
+        entry = self.table[state]
+        while entry:
+            i = entry & _MOVE_MASK
+            moves.append(self.moves[i])
+            state = facelets.apply(state, self._perms[i])
+            entry = self.table[state]
+        return moves
+
+    def lookup(self, cube):
+        """
+        :return: An optimal solution for a cube within `depth` moves of solved, else None
+        """
+        return self.lookup_state(self._state(cube))
+
+    def lookup_state(self, state):
+        """Like lookup(), for a state whose stickers are already named after their faces"""
+        if state not in self.table:
+            return None
+        return self._path_to_solved(state)
+
+    def solve(self, cube, max_depth=None):
+        """
+        Search forward from the cube until a stored state is reached. The first layer of
+        the search that meets the table gives an optimal solution.
+        :param max_depth: Longest solution to look for, at most 2 * depth (the default)
+        :return: An optimal solution as a list of moves, or None if it is too far away
+        """
+        return self.solve_state(self._state(cube), max_depth)
+
+    def solve_state(self, state, max_depth=None):
+        """Like solve(), for a state whose stickers are already named after their faces"""
+        if max_depth is None:
+            max_depth = 2 * self.depth
+        parents = {state: None}
+        frontier = [state]
+        forward_depth = max_depth - min(self.depth, max_depth)
+        for forward in range(forward_depth + 1):
+            best = None
+            for node in frontier:
+                entry = self.table.get(node)
+                if entry is not None and (best is None or entry < self.table[best]):
+                    best = node
+            if best is not None:
+                if forward + (self.table[best] >> _MOVE_BITS) > max_depth:
+                    return None
+                return self._path_from(parents, best) + self._path_to_solved(best)
+            if forward == forward_depth:
+                break
+
+            next_frontier = []
+            for node in frontier:
+                for i, perm in enumerate(self._perms):
+                    child = facelets.apply(node, perm)
+                    if child not in parents:
+                        parents[child] = (node, i)
+                        next_frontier.append(child)
+            frontier = next_frontier
+        return None
+
+    def _path_from(self, parents, state):
+        moves = []
+        while parents[state] is not None:
+            state, i = parents[state]
+            moves.append(self.moves[i])
+        moves.reverse()
+        return moves
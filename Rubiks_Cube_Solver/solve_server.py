@@ -0,0 +1,229 @@
+"""A local solve service speaking JSON lines over TCP or a Unix socket.
+
+Requests, one JSON object per line:
+    {"id": 1, "cube": "DLURRDFFUBBLDDRBRBLDLRBFRUULFBDDUFBRBBRFUDFLUDLUULFLFR"}
+    {"cmd": "health"}
+    {"cmd": "stats"}
+Solve responses carry the request id and either "moves" and "opt_moves", or "error".
+Responses to pipelined requests are written as they complete, not in request order.
+
+    python -m Rubiks_Cube_Solver.solve_server --port 8765
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .batch import solve_one
+from .cube_solver import build_tables
+
+
+def _solve_batch(tasks):
+    return [solve_one(None, cube_str, optimize)[2:] for cube_str, optimize in tasks]
+
+
+class SolveServer:
+
+    def __init__(self, workers=None, queue_size=1024, batch_size=16, batch_delay=0.002,
+                 timeout=30.0, executor=None):
+        """
+        :param workers: Number of solver processes (default: one per CPU)
+        :param queue_size: Maximum number of queued solves. When the queue is full the
+            server stops reading from clients until it drains.
+        :param batch_size: Maximum number of solves sent to a worker at once
+        :param batch_delay: Seconds to wait for a batch to fill up before sending it
+        :param timeout: Seconds before a solve request is answered with a timeout error
+        :param executor: An Executor to solve in, instead of a new ProcessPoolExecutor
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.timeout = timeout
+        self._executor = executor
+        self._own_executor = executor is None
+        self._queue = asyncio.Queue(queue_size)
+        self._inflight = asyncio.Semaphore(2 * self.workers)
+        self._servers = []
+        self._dispatcher = None
+        self.started = time.time()
+        self.counts = {'requests': 0, 'solved': 0, 'failed': 0, 'timeouts': 0,
+                       'bad_requests': 0, 'batches': 0, 'batched_solves': 0}
+
+    async def start_tcp(self, host='127.0.0.1', port=0):
+        """
+        :return: The (host, port) the server is listening on
+        """
+        self._start_dispatcher()
+        server = await asyncio.start_server(self._handle_client, host, port)
+        self._servers.append(server)
+        return server.sockets[0].getsockname()[:2]
+
+    async def start_unix(self, path):
+        self._start_dispatcher()
+        server = await asyncio.start_unix_server(self._handle_client, path)
+        self._servers.append(server)
+
+    async def serve_forever(self):
+        await asyncio.gather(*(s.serve_forever() for s in self._servers))
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        if self._dispatcher:
+            self._dispatcher.cancel()
+        if self._own_executor and self._executor:
+            # shutdown() waits for the workers: keep it off the event loop thread
+            await asyncio.to_thread(self._executor.shutdown, cancel_futures=True)
+
+    def _start_dispatcher(self):
+        if self._dispatcher is None:
+            if self._executor is None:
+                build_tables()
+                self._executor = ProcessPoolExecutor(self.workers, initializer=build_tables)
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    def stats(self):
+        stats = dict(self.counts)
+        stats['queued'] = self._queue.qsize()
+        stats['uptime'] = time.time() - self.started
+        stats['avg_batch_size'] = (self.counts['batched_solves'] / self.counts['batches']
+                                   if self.counts['batches'] else 0.0)
+        return stats
+
+    async def _handle_client(self, reader, writer):
+        lock = asyncio.Lock()
+        pending = set()
+
+        async def respond(response):
+            async with lock:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                except ValueError as e:
+                    self.counts['bad_requests'] += 1
+                    await respond({'error': f"invalid request: {e}"})
+                    continue
+
+                cmd = request.get('cmd')
+                if cmd == 'health':
+                    await respond({'status': 'ok'})
+                elif cmd == 'stats':
+                    await respond(self.stats())
+                elif cmd is not None or not isinstance(request.get('cube'), str):
+                    self.counts['bad_requests'] += 1
+                    await respond({'id': request.get('id'), 'error': "expected 'cube' or 'cmd'"})
+                else:
+                    self.counts['requests'] += 1
+                    future = asyncio.get_running_loop().create_future()
+                    # blocks while the queue is full, which stops us reading from the client
+                    await self._queue.put((request['cube'], request.get('optimize', True), future))
+                    task = asyncio.create_task(self._respond_when_done(request.get('id'), future, respond))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond_when_done(self, request_id, future, respond):
+        try:
+            moves, opt_moves, error = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.counts['timeouts'] += 1
+            await respond({'id': request_id, 'error': f"timed out after {self.timeout}s"})
+            return
+        if error:
+            self.counts['failed'] += 1
+            await respond({'id': request_id, 'error': error})
+        else:
+            self.counts['solved'] += 1
+            await respond({'id': request_id, 'moves': moves, 'opt_moves': opt_moves})
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.batch_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # requests that already timed out are not worth solving
+        return [item for item in batch if not item[2].done()]
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._inflight.acquire()
+            batch = await self._next_batch()
+            if not batch:
+                self._inflight.release()
+                continue
+            self.counts['batches'] += 1
+            self.counts['batched_solves'] += len(batch)
+            result = loop.run_in_executor(self._executor, _solve_batch,
+                                          [(cube_str, optimize) for cube_str, optimize, _ in batch])
+            result.add_done_callback(lambda f, batch=batch: self._finish_batch(f, batch))
+
+    def _finish_batch(self, result, batch):
+        self._inflight.release()
+        if result.cancelled():
+            return
+        error = result.exception()
+        for i, (_, _, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_result((None, None, f"{type(error).__name__}: {error}"))
+            else:
+                future.set_result(result.result()[i])
+
+
+async def _serve(args):
+    server = SolveServer(workers=args.workers, queue_size=args.queue_size,
+                         batch_size=args.batch_size, timeout=args.timeout)
+    if args.unix:
+        await server.start_unix(args.unix)
+        print(f"Listening on {args.unix}")
+    else:
+        host, port = await server.start_tcp(args.host, args.port)
+        print(f"Listening on {host}:{port}")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Rubik's Cube solve server")
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='TCP host to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port to listen on')
+    parser.add_argument('--unix', type=str, default=None, help='Listen on this Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=None, help='Number of solver processes')
+    parser.add_argument('--queue_size', type=int, default=1024, help='Maximum number of queued solves')
+    parser.add_argument('--batch_size', type=int, default=16, help='Maximum solves per worker batch')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
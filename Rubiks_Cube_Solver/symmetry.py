@@ -0,0 +1,123 @@
+from . import facelets
+from .facelets import compose, invert, move_for_perm
+
+
+class SymmetryTransform:
+    """A whole-cube symmetry (a rotation, possibly mirrored) followed by a color relabeling.
+
+    Maps between a cube and its canonical form: canonical = transform.apply(cube), and a
+    solution of the canonical form maps back to a solution of the cube with to_original().
+    """
+
+    def __init__(self, matrix, colors=None):
+        """
+        :param matrix: One of facelets.SYMMETRY_MATRICES
+        :param colors: A dict {canonical color: original color}, or None to keep the colors
+        """
+        self.matrix = matrix
+        self.perm = facelets.perm_from_matrix(matrix)
+        self._inverse = invert(self.perm)
+        self.colors = colors
+
+    def __repr__(self):
+        return f"SymmetryTransform(mirror={self.is_mirror()}, colors={self.colors})"
+
+    def is_mirror(self):
+        return facelets.determinant(self.matrix) < 0
+
+    def apply(self, cube):
+        """
+        :param cube: A Cube, a cube string or a state
+        :return: The transformed state (bytes)
+        """
+        state = facelets.apply(facelets.to_state(cube), self.perm)
+        if self.colors is not None:
+            state, _ = facelets.relabel(state)
+        return state
+
+    def _map_moves(self, moves, before, after):
+        if isinstance(moves, str):
+            moves = moves.split()
+        result = []
+        for move in moves:
+            mapped = move_for_perm(compose(before, facelets.MOVE_PERMS[move], after))
+            assert mapped is not None, f"Move {move} has no image under {self}"
+            result.append(mapped)
+        return result
+
+    def to_original(self, moves):
+        """
+        :param moves: Moves that act on the transformed cube
+        :return: The equivalent moves acting on the original cube
+        """
+        return self._map_moves(moves, self.perm, self._inverse)
+
+    def to_canonical(self, moves):
+        """
+        :param moves: Moves that act on the original cube
+        :return: The equivalent moves acting on the transformed cube
+        """
+        return self._map_moves(moves, self._inverse, self.perm)
+
+
+def symmetries(mirrors=True):
+    """
+    :return: A list of SymmetryTransforms for the 24 rotations (and their 24 mirror images)
+    """
+    matrices = facelets.SYMMETRY_MATRICES if mirrors else facelets.ROTATION_MATRICES
+    return [SymmetryTransform(m) for m in matrices]
+
+
+_SYMMETRIES = {True: symmetries(True), False: symmetries(False)}
+
+
+def _rotation_sequences():
+    sequences = {facelets.IDENTITY: []}
+    frontier = [facelets.IDENTITY]
+    while frontier:
+        next_frontier = []
+        for perm in frontier:
+            for move in facelets.ROTATIONS:
+                rotated = compose(perm, facelets.MOVE_PERMS[move])
+                if rotated not in sequences:
+                    sequences[rotated] = sequences[perm] + [move]
+                    next_frontier.append(rotated)
+        frontier = next_frontier
+    return sequences
+
+
+_ROTATION_SEQUENCES = _rotation_sequences()
+
+
+def rotation_moves(perm):
+    """
+    :param perm: The permutation of a whole-cube rotation
+    :return: A shortest list of X/Y/Z moves with that permutation
+    """
+    return list(_ROTATION_SEQUENCES[perm])
+
+
+def canonicalize(cube, mirrors=True):
+    """
+    Find the minimal representative of a cube under whole-cube rotations, reflections
+    (if `mirrors`) and color permutations. Cubes that differ only by those have the same
+    canonical form, and solutions carry over with SymmetryTransform.to_original().
+    :param cube: A Cube, a cube string or a state
+    :return: A pair (canonical cube string, SymmetryTransform)
+    """
+    state = facelets.to_state(cube)
+    best = best_sym = best_colors = None
+    for sym in _SYMMETRIES[mirrors]:
+        candidate, colors = facelets.relabel(facelets.apply(state, sym.perm))
+        if best is None or candidate < best:
+            best, best_sym, best_colors = candidate, sym, colors
+    transform = SymmetryTransform(best_sym.matrix, best_colors)
+    return best.decode('ascii'), transform
+
+
+def equal_up_to_rotation(a, b):
+    """
+    :return: True if the two cubes differ at most by a whole-cube rotation
+    """
+    a, b = facelets.to_state(a), facelets.to_state(b)
+    return any(facelets.apply(a, sym.perm) == b for sym in _SYMMETRIES[False])
@@ -0,0 +1,35 @@
+from . import facelets
+from .symmetry import symmetries
+
+_ROTATION_PERMS = frozenset(sym.perm for sym in symmetries(mirrors=False))
+
+
+def net_permutation(moves):
+    """
+    :param moves: A list of moves, or a string of moves separated by spaces
+    :return: The sticker permutation of the whole sequence (see facelets)
+    """
+    try:
+        return facelets.sequence_perm(moves)
+    except KeyError as e:
+        raise ValueError(f"Unknown move: {e.args[0]}") from None
+
+
+def sequences_equivalent(original, optimized, up_to_rotation=True):
+    """
+    Compare two move sequences by their net permutations, without simulating a Cube.
+    :param up_to_rotation: Also accept sequences that differ by a final whole-cube
+        rotation, as optimize_moves() output does
+    """
+    a, b = net_permutation(original), net_permutation(optimized)
+    if a == b:
+        return True
+    return up_to_rotation and facelets.compose(facelets.invert(a), b) in _ROTATION_PERMS
+
+
+def verify_many(pairs, up_to_rotation=True):
+    """
+    :param pairs: An iterable of (original, optimized) move sequences
+    :return: A list with a bool for each pair, True where the sequences are equivalent
+    """
+    return [sequences_equivalent(original, optimized, up_to_rotation) for original, optimized in pairs]
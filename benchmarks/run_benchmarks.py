@@ -0,0 +1,278 @@
+"""Repeatable performance measurements over fixed, seeded corpora.
+
+    python -m benchmarks.run_benchmarks                      # compare with the baseline
+    python -m benchmarks.run_benchmarks --update_baseline    # record a new baseline
+
+Each benchmark times a fixed batch of work several times and reports the throughput of
+each sample (operations per second) as a median and percentiles, in JSON. Samples are timed
+in process CPU time with the garbage collector off, as timeit does, and repeat the batch
+until they last at least --min_time; the benchmarks take turns over --rounds rounds. The
+run fails if any median falls below its baseline median by more than --threshold, if
+given, or else by more than the threshold recorded in the baseline for that benchmark
+(between DEFAULT_THRESHOLD and MAX_THRESHOLD, from the spread seen when it was recorded).
+"""
+import gc
+import json
+import math
+import os
+import random
+import sys
+import time
+
+from Rubiks_Cube_Solver.cube_model import Cube, ROT_YZ_CW
+from Rubiks_Cube_Solver.cube_solver import Solver
+from Rubiks_Cube_Solver.move_optimizer import optimize_moves
+from Rubiks_Cube_Solver.symmetry import equal_up_to_rotation
+from Rubiks_Cube_Solver.verify import verify_many
+
+SOLVED_CUBE_STR = "OOOOOOOOOYYYWWWGGGBBBYYYWWWGGGBBBYYYWWWGGGBBBRRRRRRRRR"
+MOVES = ["L", "R", "U", "D", "F", "B", "M", "E", "S"]
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+MAX_THRESHOLD = 0.4
+
+
+def _scrambled_cubes(seed, count):
+    rng = random.Random(seed)
+    cubes = []
+    for _ in range(count):
+        c = Cube(SOLVED_CUBE_STR)
+        c.sequence(" ".join(rng.choices(MOVES, k=200)))
+        cubes.append(c.flat_str())
+    return cubes
+
+
+def _solutions(cubes):
+    result = []
+    for cube_str in cubes:
+        solver = Solver(Cube(cube_str))
+        solver.solve()
+        result.append(solver.moves)
+    return result
+
+
+def bench_cube_moves(seed):
+    moves = " ".join(random.Random(seed).choices(MOVES, k=1000))
+    cube = Cube(SOLVED_CUBE_STR)
+    return lambda: cube.sequence(moves), 1000
+
+
+def bench_piece_rotate(seed):
+    pieces = Cube(_scrambled_cubes(seed, 1)[0]).pieces
+
+    def run():
+        for _ in range(40):
+            for piece in pieces:
+                piece.rotate(ROT_YZ_CW)
+    return run, 40 * len(pieces)
+
+
+def bench_find_piece(seed):
+    cube = Cube(_scrambled_cubes(seed, 1)[0])
+    colors = sorted(cube.colors())
+    rng = random.Random(seed)
+    queries = [rng.sample(colors, rng.choice((1, 2, 3))) for _ in range(500)]
+
+    def run():
+        for query in queries:
+            cube.find_piece(*query)
+    return run, len(queries)
+
+
+def bench_solver_solve(seed):
+    cubes = _scrambled_cubes(seed, 5)
+
+    def run():
+        for cube_str in cubes:
+            Solver(Cube(cube_str)).solve()
+    return run, len(cubes)
+
+
+def bench_optimize_moves(seed):
+    solutions = _solutions(_scrambled_cubes(seed, 5))
+    total = sum(len(moves) for moves in solutions)
+
+    def run():
+        for moves in solutions:
+            optimize_moves(moves)
+    return run, total
+
+
+def _optimized_pairs(seed):
+    return [(moves, optimize_moves(moves)) for moves in _solutions(_scrambled_cubes(seed, 5))]
+
+
+def bench_verify_permutation(seed):
+    pairs = _optimized_pairs(seed)
+    return lambda: verify_many(pairs), len(pairs)
+
+
+def bench_verify_replay(seed):
+    # what verify_many replaces: replaying both sequences on Cube copies
+    pairs = _optimized_pairs(seed)
+
+    def run():
+        for original, optimized in pairs:
+            a, b = Cube(SOLVED_CUBE_STR), Cube(SOLVED_CUBE_STR)
+            a.sequence(" ".join(original))
+            b.sequence(" ".join(optimized))
+            equal_up_to_rotation(a, b)
+    return run, len(pairs)
+
+
+BENCHMARKS = {
+    'cube_moves': bench_cube_moves,
+    'piece_rotate': bench_piece_rotate,
+    'find_piece': bench_find_piece,
+    'solver_solve': bench_solver_solve,
+    'optimize_moves': bench_optimize_moves,
+    'verify_permutation': bench_verify_permutation,
+    'verify_replay': bench_verify_replay,
+}
+
+
+def percentile(values, p):
+    """
+    :return: The p-th percentile (0 to 100) of values, interpolating between samples
+    """
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def _prepare(name, seed, min_time):
+    """
+    :return: The benchmark's (run, operations per run, runs per sample), after a warm up
+    """
+    run, ops = BENCHMARKS[name](seed)
+    run()  # warm up
+    start = time.process_time()
+    run()
+    return run, ops, max(1, math.ceil(min_time / max(time.process_time() - start, 1e-6)))
+
+
+def _sample(run, ops, repeats):
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.process_time()
+        for _ in range(repeats):
+            run()
+        return ops * repeats / (time.process_time() - start)
+    finally:
+        gc.enable()
+
+
+def run_benchmarks(names, samples=5, seed=2024, min_time=0.2, rounds=5):
+    """
+    Run the benchmarks in turn, rounds times over, so a machine that slows down or speeds
+    up for a while moves every benchmark a little rather than one of them a lot. The median
+    reported is the median of the rounds' medians.
+
+    :param samples: Timed samples per benchmark in each round
+    :param min_time: Seconds each sample should last at least; the batch is repeated to fill it
+    :return: A dict of throughput statistics (operations per second) for each benchmark
+    """
+    prepared = {name: _prepare(name, seed, min_time) for name in names}
+    rates = {name: [] for name in names}
+    round_medians = {name: [] for name in names}
+    for _ in range(rounds):
+        for name in names:
+            round_rates = [_sample(*prepared[name]) for _ in range(samples)]
+            rates[name] += round_rates
+            round_medians[name].append(percentile(round_rates, 50))
+    return {name: {
+        'unit': 'ops/s',
+        'samples': len(rates[name]),
+        'repeats': prepared[name][2],
+        'median': percentile(round_medians[name], 50),
+        'p10': percentile(rates[name], 10),
+        'p90': percentile(rates[name], 90),
+        'min': min(rates[name]),
+        'max': max(rates[name]),
+        'slowest_round': min(round_medians[name]),
+    } for name in names}
+
+
+def run_benchmark(name, samples=5, seed=2024, min_time=0.2):
+    """
+    :return: A dict of throughput statistics (operations per second) for one benchmark
+    """
+    return run_benchmarks([name], samples, seed, min_time, rounds=1)[name]
+
+
+def baseline_threshold(stats):
+    """
+    :return: The threshold to record for a benchmark: twice the drop of its slowest round
+        below its median, so a run as noisy as the baseline itself does not fail, kept
+        between DEFAULT_THRESHOLD and MAX_THRESHOLD
+    """
+    spread = 2 * (1 - stats['slowest_round'] / stats['median'])
+    return round(min(MAX_THRESHOLD, max(DEFAULT_THRESHOLD, spread)), 3)
+
+
+def compare(results, baseline, threshold=None):
+    """
+    :param threshold: Allowed fractional drop of each median below its baseline. If None,
+        the threshold recorded in the baseline, or DEFAULT_THRESHOLD.
+    :return: A list of messages, one for each benchmark that regressed
+    """
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]['median']
+        allowed = threshold if threshold is not None else baseline[name].get('threshold', DEFAULT_THRESHOLD)
+        if stats['median'] < expected * (1 - allowed):
+            regressions.append(f"{name}: median {stats['median']:.1f} ops/s is "
+                               f"{100 * (1 - stats['median'] / expected):.1f}% below "
+                               f"baseline {expected:.1f} ops/s")
+    return regressions
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Rubik's Cube solver benchmarks")
+    parser.add_argument('--only', type=str, nargs='*', default=None, help='Benchmarks to run')
+    parser.add_argument('--samples', type=int, default=5, help='Timed samples per benchmark and round')
+    parser.add_argument('--rounds', type=int, default=5, help='Times every benchmark is run in turn')
+    parser.add_argument('--min_time', type=float, default=0.2, help='CPU seconds each sample lasts at least')
+    parser.add_argument('--seed', type=int, default=2024, help='Seed for the benchmark corpora')
+    parser.add_argument('--baseline', type=str, default=BASELINE_FILE, help='Baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='Fail if a median drops more than this fraction below the baseline '
+                             '(default: the threshold recorded in the baseline for each benchmark)')
+    parser.add_argument('--output', type=str, default=None, help='Also write the results to this file')
+    parser.add_argument('--update_baseline', action='store_true', help='Write the results as the new baseline')
+    args = parser.parse_args(argv)
+
+    names = args.only or list(BENCHMARKS)
+    results = run_benchmarks(names, args.samples, args.seed, args.min_time, args.rounds)
+    report = json.dumps(results, indent=2, sort_keys=True)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+    if args.update_baseline:
+        baseline = {name: dict(stats, threshold=baseline_threshold(stats))
+                    for name, stats in results.items()}
+        with open(args.baseline, "w") as f:
+            f.write(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}", file=sys.stderr)
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    for message in regressions:
+        print("REGRESSION " + message, file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
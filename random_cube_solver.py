@@ -1,10 +1,17 @@
+import itertools
+import json
+import multiprocessing
+import os
 import random
+import signal
 import time
 import sys
 from Rubiks_Cube_Solver import cube_solver
 from Rubiks_Cube_Solver.cube_model import Cube
-from Rubiks_Cube_Solver.cube_solver import Solver
+from Rubiks_Cube_Solver.cube_solver import build_tables, solve, SolveFailed
 from Rubiks_Cube_Solver.move_optimizer import optimize_moves
+from Rubiks_Cube_Solver.histogram import Histogram
+from Rubiks_Cube_Solver.profiling import profile_solves
 try:
     from tqdm import tqdm
 except ImportError:
@@ -14,68 +21,266 @@ SOLVED_CUBE_STR = "OOOOOOOOOYYYWWWGGGBBBYYYWWWGGGBBBYYYWWWGGGBBBRRRRRRRRR"
 MOVES = ["L", "R", "U", "D", "F", "B", "M", "E", "S"]
 
 
-def random_cube_model():
+def cube_rng(seed, index):
     """
+    Every cube gets its own generator derived from (seed, index), so a run gives the same
+    cubes however they are spread over workers, and any one of them can be replayed.
+    :return: A random.Random for the cube at index in the run with seed
+    """
+    return random.Random(f"{seed}:{index}")
+
+
+def random_cube_model(rng=random):
+    """
+    :param rng: The random number generator to scramble with
     :return: A new scrambled Cube
     """
-    scramble_moves = " ".join(random.choices(MOVES, k=200))
+    scramble_moves = " ".join(rng.choices(MOVES, k=200))
     a = Cube(SOLVED_CUBE_STR)
     a.sequence(scramble_moves)
     return a
 
 
-def run(max_solves=None, save_file="solver_stats.txt"):
-    successes = 0
-    failures = 0
-    avg_opt_moves = 0.0
-    avg_moves = 0.0
-    avg_time = 0.0
-    total = 0
+def solve_index(seed, index):
+    """
+    Scramble and solve the cube at index in the run with seed.
+    :return: A dict record with the cube, the status ('solved', 'unsolved' or 'error'),
+        move counts, solve time and the time of each solver phase
+    """
+    cube_str = random_cube_model(cube_rng(seed, index)).flat_str()
+    moves, phase_times, error = [], {}, None
+    start = time.time()
+    try:
+        moves, _, phase_times = solve(cube_str)
+        status = 'solved'
+    except SolveFailed:
+        status = 'unsolved'
+    except Exception as e:
+        status, error = 'error', f"{type(e).__name__}: {e}"
+    duration = time.time() - start
+    result = {'seed': seed, 'index': index, 'cube': cube_str, 'status': status,
+              'solved': status == 'solved', 'time': duration, 'moves': len(moves),
+              'opt_moves': None, 'phase_times': phase_times}
+    if error:
+        result['error'] = error
+    if result['solved']:
+        result['opt_moves'] = len(optimize_moves(moves))
+    return result
+
+
+def _solve_task(task):
+    return solve_index(*task)
+
+
+def new_stats():
+    # sums rather than running averages, so counts from any number of workers merge exactly
+    return {"successes": 0, "failures": 0, "total_moves": 0, "total_opt_moves": 0, "total_time": 0.0,
+            "histograms": {"time": Histogram(1e6), "moves": Histogram(), "opt_moves": Histogram()}}
+
+
+def add_result(stats, result):
+    if result['solved']:
+        stats["successes"] += 1
+        stats["total_moves"] += result['moves']
+        stats["total_opt_moves"] += result['opt_moves']
+        stats["total_time"] += result['time']
+        for name, h in stats["histograms"].items():
+            h.record(result[name])
+    else:
+        stats["failures"] += 1
+
+
+def stats_to_json(stats):
+    return dict(stats, histograms={k: h.to_dict() for k, h in stats["histograms"].items()})
+
+
+def stats_from_json(d):
+    return dict(d, histograms={k: Histogram.from_dict(h) for k, h in d["histograms"].items()})
+
+
+def summary(stats):
+    """
+    :return: A dict with the counts and averages over the successful solves
+    """
+    successes = stats["successes"]
+    n = float(successes or 1)
+    return {
+        "successes": successes,
+        "failures": stats["failures"],
+        "avg_moves": stats["total_moves"] / n,
+        "avg_opt_moves": stats["total_opt_moves"] / n,
+        "avg_time": stats["total_time"] / n,
+        "total": successes + stats["failures"],
+        "time": stats["histograms"]["time"].summary(),
+        "moves": stats["histograms"]["moves"].summary(),
+        "opt_moves": stats["histograms"]["opt_moves"].summary(),
+    }
+
+
+def _results(seed, start, stop, workers):
+    """
+    Solve the cubes from start (to stop, or forever if stop is None), in index order.
+    """
+    # before the first solve is timed, and before the workers fork
+    build_tables()
+    if workers == 1:
+        for index in (itertools.count(start) if stop is None else range(start, stop)):
+            yield solve_index(seed, index)
+        return
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        # hand out indices a batch at a time; Pool.imap would consume an endless range eagerly
+        batch = 64 * (workers or multiprocessing.cpu_count())
+        for first in itertools.count(start, batch):
+            last = first + batch if stop is None else min(first + batch, stop)
+            if last <= first:
+                return
+            yield from pool.imap(_solve_task, ((seed, i) for i in range(first, last)), 4)
+
+
+def save_checkpoint(path, seed, next_index, stats, records_offset=None):
+    """
+    Atomically replace the checkpoint file, so a crash leaves either the old or the new one.
+    :param next_index: Index of the first cube not yet counted in stats
+    :param records_offset: Size of the records file when the checkpoint was taken
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"seed": seed, "next_index": next_index, "stats": stats_to_json(stats),
+                   "records_offset": records_offset}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_stats(save_file, seed, stats):
+    with open(save_file, "w") as f:
+        f.write(f"seed: {seed}\n")
+        for k, v in summary(stats).items():
+            f.write(f"{k}: {v}\n")
+
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _init_worker():
+    # forked workers inherit _terminate; pool.terminate() must just end them
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    build_tables()
+
+
+def run(max_solves=None, save_file="solver_stats.txt", workers=1, seed=None,
+        records_file=None, checkpoint_file=None, checkpoint_interval=60.0, resume=False):
+    """
+    :param workers: Number of worker processes (None: one per CPU)
+    :param seed: Seed for the run. A random seed is chosen and printed if none is given.
+    :param records_file: Append a JSON line for every solve to this file
+    :param checkpoint_file: Save the stats here every checkpoint_interval seconds and on exit
+    :param resume: Continue the run saved in checkpoint_file instead of starting a new one
+    :return: The stats summary
+    """
+    stats = new_stats()
+    start_index = 0
+    records_offset = None
+    if resume:
+        checkpoint = load_checkpoint(checkpoint_file)
+        seed, start_index = checkpoint["seed"], checkpoint["next_index"]
+        stats = stats_from_json(checkpoint["stats"])
+        records_offset = checkpoint["records_offset"]
+        print(f"Resuming at cube {start_index}")
+    if seed is None:
+        seed = random.randrange(1 << 32)
+    print(f"Seed: {seed}")
+
+    records = None
+    if records_file:
+        records = open(records_file, "a", buffering=1 << 16)
+        if records_offset is not None:
+            # drop records written after the checkpoint, they are solved again
+            records.truncate(records_offset)
+    next_index = start_index
+
+    def checkpoint():
+        if not checkpoint_file:
+            return
+        offset = None
+        if records:
+            records.flush()
+            offset = records.tell()
+        save_checkpoint(checkpoint_file, seed, next_index, stats, offset)
+
+    previous_handler = signal.signal(signal.SIGTERM, _terminate)
     bar = None
     if max_solves and tqdm:
-        bar = tqdm(total=max_solves, desc="Solving Cubes")
+        bar = tqdm(total=max_solves, initial=start_index, desc="Solving Cubes")
+    last_checkpoint = time.time()
     try:
-        while True:
-            if max_solves and total >= max_solves:
-                break
-            C = random_cube_model()
-            cube_solverr = Solver(C)
-            start = time.time()
-            cube_solverr.solve()
-            duration = time.time() - start
-            if C.is_solved():
-                opt_moves = optimize_moves(cube_solverr.moves)
-                successes += 1
-                avg_moves = (avg_moves * (successes - 1) + len(cube_solverr.moves)) / float(successes)
-                avg_time = (avg_time * (successes - 1) + duration) / float(successes)
-                avg_opt_moves = (avg_opt_moves * (successes - 1) + len(opt_moves)) / float(successes)
-            else:
-                failures += 1
-                print(f"Failed ({successes + failures}): {C.flat_str()}")
-            total = successes + failures
+        for result in _results(seed, start_index, max_solves, workers):
+            add_result(stats, result)
+            next_index = result['index'] + 1
+            if records:
+                records.write(json.dumps(result) + "\n")
+            if not result['solved']:
+                print(f"Failed (seed={seed} index={result['index']}): {result['cube']}")
             if bar:
                 bar.update(1)
+            total = stats["successes"] + stats["failures"]
             if total == 1 or total % 100 == 0:
-                pass_percentage = 100 * successes / total
-                print(f"{total}: {successes} successes ({pass_percentage:0.3f}% passing)"
-                      f" avg_moves={avg_moves:0.3f} avg_opt_moves={avg_opt_moves:0.3f}"
-                      f" avg_time={avg_time:0.3f}s")
+                s = summary(stats)
+                pass_percentage = 100 * s["successes"] / total
+                print(f"{total}: {s['successes']} successes ({pass_percentage:0.3f}% passing)"
+                      f" avg_moves={s['avg_moves']:0.3f} avg_opt_moves={s['avg_opt_moves']:0.3f}"
+                      f" avg_time={s['avg_time']:0.3f}s p99_time={s['time']['p99']:0.3f}s"
+                      f" p99_moves={s['moves']['p99']:0.0f}")
+            if time.time() - last_checkpoint >= checkpoint_interval:
+                checkpoint()
+                last_checkpoint = time.time()
     except KeyboardInterrupt:
-        print("\nInterrupted by user. Saving stats...")
-        stats = {
-            "successes": successes,
-            "failures": failures,
-            "avg_moves": avg_moves,
-            "avg_opt_moves": avg_opt_moves,
-            "avg_time": avg_time,
-            "total": total
-        }
-        with open(save_file, "w") as f:
-            for k, v in stats.items():
-                f.write(f"{k}: {v}\n")
+        print("\nInterrupted. Saving stats...")
+        _save_stats(save_file, seed, stats)
         print(f"Stats saved to {save_file}")
-    if bar:
-        bar.close()
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+        checkpoint()
+        if records:
+            records.close()
+        if bar:
+            bar.close()
+    return summary(stats)
+
+
+def replay(seed, index):
+    """
+    Rebuild the cube at index in the run with seed, and solve it again in this process.
+    """
+    C = random_cube_model(cube_rng(seed, index))
+    print(f"Cube (seed={seed} index={index}): {C.flat_str()}")
+    print(C)
+    result = solve_index(seed, index)
+    print("Solved" if result['solved'] else "Failed", f"moves={result['moves']} opt_moves={result['opt_moves']}")
+    return result
+
+
+def profile_run(profile_dir, top=20, **kwargs):
+    """
+    Run the solves in this process under profile_solves(), print the report and save
+    the collapsed stacks and cProfile stats to profile_dir.
+    :param kwargs: Arguments for run()
+    """
+    kwargs['workers'] = 1
+    # the one-time table builds would swamp the solves in the profile
+    build_tables()
+    with profile_solves() as profile:
+        stats = run(**kwargs)
+    print(profile.report(top))
+    for path in profile.save(profile_dir):
+        print(f"Profile saved to {path}")
+    return stats
 
 
 if __name__ == '__main__':
@@ -84,5 +289,28 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Rubik's Cube random solver runner")
     parser.add_argument('--max_solves', type=int, default=None, help='Maximum number of solves to run')
     parser.add_argument('--save_file', type=str, default='solver_stats.txt', help='File to save stats on exit')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes (0: one per CPU)')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for the run, to reproduce its cubes')
+    parser.add_argument('--replay', type=int, default=None, metavar='INDEX',
+                        help='Solve only the cube at this index of the --seed run')
+    parser.add_argument('--records', type=str, default=None, help='Append a JSON line per solve to this file')
+    parser.add_argument('--checkpoint', type=str, default=None,
+                        help='File to save periodic checkpoints to (none are saved if not given)')
+    parser.add_argument('--checkpoint_interval', type=float, default=60.0, help='Seconds between checkpoints')
+    parser.add_argument('--resume', action='store_true', help='Continue the run saved in --checkpoint')
+    parser.add_argument('--profile', type=str, default=None, metavar='DIR',
+                        help='Profile the solves in one process and save the results to DIR')
     args = parser.parse_args()
-    run(max_solves=args.max_solves, save_file=args.save_file)
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
+    if args.replay is not None:
+        if args.seed is None:
+            parser.error("--replay needs --seed")
+        sys.exit(0 if replay(args.seed, args.replay)['solved'] else 1)
+    run_args = dict(max_solves=args.max_solves, save_file=args.save_file, workers=args.workers or None,
+                    seed=args.seed, records_file=args.records, checkpoint_file=args.checkpoint,
+                    checkpoint_interval=args.checkpoint_interval, resume=args.resume)
+    if args.profile:
+        profile_run(args.profile, **run_args)
+    else:
+        run(**run_args)
@@ -1,14 +1,40 @@
+import os
+import json
 import string
+import asyncio
 import unittest
 import itertools
+import pickle
+import tempfile
 import traceback
+import contextlib
 
 import Rubiks_Cube_Solver.cube_model as cube
 from Rubiks_Cube_Solver.cube_model import Cube
 from Rubiks_Cube_Solver.geometry import Vec3, Matrix
-from Rubiks_Cube_Solver.cube_solver import Solver
+from Rubiks_Cube_Solver.cube_solver import Solver, build_tables, solve
 from Rubiks_Cube_Solver.move_optimizer import optimize_moves
 import Rubiks_Cube_Solver.move_optimizer
+from Rubiks_Cube_Solver import facelets
+from Rubiks_Cube_Solver.symmetry import canonicalize, equal_up_to_rotation
+from Rubiks_Cube_Solver.short_distance import ShortDistanceTable
+from Rubiks_Cube_Solver.batch import solve_many
+from Rubiks_Cube_Solver.solve_server import SolveServer
+from Rubiks_Cube_Solver.portfolio import solve_portfolio
+from Rubiks_Cube_Solver.notation import parse_moves, format_moves, count_moves
+from Rubiks_Cube_Solver.verify import sequences_equivalent, verify_many
+from benchmarks.run_benchmarks import percentile, compare, run_benchmark, run_benchmarks, baseline_threshold
+import random_cube_solver
+from Rubiks_Cube_Solver.histogram import Histogram
+from Rubiks_Cube_Solver.profiling import profile_solves, FOCUS
+from Rubiks_Cube_Solver.nxn_cube import NxNCube, move_perm
+from Rubiks_Cube_Solver.algorithm import Algorithm, PieceCycle, commutator, conjugate
+from Rubiks_Cube_Solver import explore
+from Rubiks_Cube_Solver.cube_state import CubeState
+from Rubiks_Cube_Solver.search import Search, distance_table_heuristic
+from Rubiks_Cube_Solver import cross_table
+from Rubiks_Cube_Solver import pair_table
+from Rubiks_Cube_Solver.framed_cube import FramedCube, FRAMES
 
 solved_cube_str = \
 """    UUU
@@ -669,13 +695,37 @@ class TestSolver(unittest.TestCase):
         solver = Solver(c)
         self.assertRaisesRegex(Exception, "Stuck in loop - unsolvable cube", solver.solve)
 
+    def test_solve_leaves_input_untouched(self):
+        c = Cube(self.cubes[2])
+        solution = solve(c)
+        self.assertEqual(Cube(self.cubes[2]), c)
+        self.assertEqual(c.flat_str(), solution.cube)
+        self.assertEqual(set(Solver.PHASES), set(solution.phase_times))
+        c.sequence(" ".join(solution.moves))
+        self.assertTrue(c.is_solved())
+
+        state = facelets.to_state(self.cubes[3])
+        self.assertEqual(solve(state).moves, solve(self.cubes[3]).moves)
+        # the table phases run on the state: the same moves as a Solver on a Cube
+        for cube_str in self.cubes:
+            solver = Solver(Cube(cube_str), virtual_rotations=True)
+            solver.solve()
+            self.assertEqual(solver.moves, solve(cube_str).moves)
+            stream = Rubiks_Cube_Solver.move_optimizer.MoveStream()
+            solver = Solver(Cube(cube_str), move_stream=stream)
+            solver.solve()
+            moves = solve(cube_str, move_stream=Rubiks_Cube_Solver.move_optimizer.MoveStream()).moves
+            self.assertEqual(solver.moves, moves)
+        self.assertRaisesRegex(Exception, "unsolvable cube", solve, self.unsolvable_cubes[1])
+
+
 class TestOptimize(unittest.TestCase):
 
     moves = (('R', 'Ri'), ('L', 'Li'), ('U', 'Ui'), ('D', 'Di'), ('F', 'Fi'), ('B', 'Bi'),
              ('M', 'Mi'), ('E', 'Ei'), ('S', 'Si'), ('X', 'Xi'), ('Y', 'Yi'), ('Z', 'Zi'))
 
     def test_optimize_repeat_three(self):
-        for cw, cc in self.moves:
+        for cw, cc in self.moves[:9]:
             self.assertEqual([cc], optimize_moves([cw, cw, cw]))
             self.assertEqual([cw], optimize_moves([cc, cc, cc]))
             self.assertEqual(['_', cw], optimize_moves(['_', cc, cc, cc]))
@@ -706,10 +756,19 @@ class TestOptimize(unittest.TestCase):
 
     def test_full_cube_rotation_optimization(self):
         for cw, cc in (('X', 'Xi'), ('Y', 'Yi'), ('Z', 'Zi')):
-            for moves in ([cc, cw], [cw, cc]):
+            for moves in ([cc, cw], [cw, cc], [cw, cw, cw], [cc] * 5):
                 Rubiks_Cube_Solver.move_optimizer.apply_no_full_cube_rotation_optimization(moves)
                 self.assertEqual([], moves)
 
+        moves = ['X', 'U', 'Y', 'R', 'Z', 'Z', 'Z', 'Z', 'M', '_']
+        actual = list(moves)
+        Rubiks_Cube_Solver.move_optimizer.apply_no_full_cube_rotation_optimization(actual)
+        self.assertEqual(['F', 'U', 'E', '_'], actual)
+        c, d = Cube(debug_cube_str), Cube(debug_cube_str)
+        c.sequence(" ".join(moves[:-1]))
+        d.sequence(" ".join(actual[:-1]))
+        self.assertTrue(equal_up_to_rotation(c, d))
+
         for cw, cc in (('Z', 'Zi'),):
             moves = [cw, 'U', 'L', 'D', 'R','E', 'M', cc]
             expected = ['L', 'D', 'R', 'U', 'Mi', 'E']
@@ -733,6 +792,723 @@ class TestOptimize(unittest.TestCase):
             d.sequence(" ".join(actual))
             self.assertEqual(str(c), str(d))
 
+    def test_axis_cancellation(self):
+        cancel = Rubiks_Cube_Solver.move_optimizer.apply_axis_cancellation
+        for moves, expected in ((['R', 'L', 'Ri'], ['L']),
+                                (['U', 'D', 'E', 'Ui', 'Di', 'Ei', 'F'], ['F']),
+                                (['F', 'R', 'M', 'Ri', 'Mi', 'Fi'], []),
+                                (['R', 'R', 'L', 'R', 'R', 'R'], ['L', 'R']),
+                                (['R', '_', 'Ri'], ['R', '_', 'Ri'])):
+            actual = list(moves)
+            cancel(actual)
+            self.assertEqual(expected, actual)
+
+    def test_axis_cancellation_long_input(self):
+        moves = ['R', 'U', 'Ui', 'Ri'] * 100000 + ['D']
+        Rubiks_Cube_Solver.move_optimizer.apply_axis_cancellation(moves)
+        self.assertEqual(['D'], moves)
+        self.assertEqual(['F'], optimize_moves(['Fi'] * 30003))
+
+    def test_optimize_stream(self):
+        c = Cube(TestSolver.cubes[2])
+        solver = Solver(c)
+        solver.solve()
+        stream = Rubiks_Cube_Solver.move_optimizer.optimize_stream(iter(solver.moves))
+        self.assertEqual(optimize_moves(solver.moves), list(stream))
+
+    def test_move_stream_lookbehind(self):
+        emitted = []
+        stream = Rubiks_Cube_Solver.move_optimizer.MoveStream(lookbehind=2, sink=emitted.append)
+        self.assertEqual([], stream.push('R'))
+        self.assertEqual([], stream.push('Y'))
+        self.assertEqual([], stream.push('U'))
+        self.assertEqual(['R'], stream.push('F'))
+        self.assertEqual([], stream.push('Fi'))
+        self.assertEqual([], stream.push('D'))
+        self.assertEqual(['U', 'D'], stream.flush())
+        self.assertEqual(['R', 'U', 'D'], emitted)
+
+    def test_solver_with_move_stream(self):
+        c = Cube(TestSolver.cubes[3])
+        solver = Solver(c, move_stream=Rubiks_Cube_Solver.move_optimizer.MoveStream())
+        solver.solve()
+        self.assertTrue(c.is_solved())
+        self.assertFalse(set(solver.moves) & {'X', 'Y', 'Z', 'Xi', 'Yi', 'Zi'})
+        c = Cube(TestSolver.cubes[3])
+        c.sequence(" ".join(solver.moves))
+        self.assertTrue(c.is_solved())
+
+    def test_window_optimization(self):
+        moves = ['R', 'L', 'Ri', 'E', 'D', 'Ei', 'Di', 'F']
+        Rubiks_Cube_Solver.move_optimizer.apply_window_optimization(moves)
+        self.assertEqual(['L', 'F'], moves)
+
+        moves = ['_', 'R', 'U', 'Ri', 'Ui', 'R', 'U', 'Ri', 'Ui', 'R', 'U', 'Ri', 'Ui', 'X', 'M', 'Mi']
+        actual = list(moves)
+        Rubiks_Cube_Solver.move_optimizer.apply_window_optimization(actual)
+        self.assertEqual(['_', 'X'], actual[:1] + actual[-1:])
+        self.assertLess(len(actual), len(moves))
+        c, d = Cube(solved_cube_str), Cube(solved_cube_str)
+        c.sequence(" ".join(moves[1:]))
+        d.sequence(" ".join(actual[1:]))
+        self.assertEqual(str(c), str(d))
+
+    def test_optimize_with_window_budget(self):
+        c = Cube(TestSolver.cubes[0])
+        solver = Solver(c)
+        solver.solve()
+        moves = optimize_moves(solver.moves, window_budget=0.5)
+        self.assertLessEqual(len(moves), len(optimize_moves(solver.moves)))
+        c = Cube(TestSolver.cubes[0])
+        c.sequence(" ".join(moves))
+        self.assertTrue(c.is_solved())
+
+
+class TestSymmetry(unittest.TestCase):
+
+    scrambled = "DLURRDFFUBBLDDRBRBLDLRBFRUULFBDDUFBRBBRFUDFLUDLUULFLFR"
+
+    def test_move_perms_match_rotation_matrices(self):
+        self.assertEqual(facelets.MOVE_PERMS['X'], facelets.perm_from_matrix(cube.ROT_YZ_CW))
+        self.assertEqual(facelets.MOVE_PERMS['Y'], facelets.perm_from_matrix(cube.ROT_XZ_CW))
+        self.assertEqual(facelets.MOVE_PERMS['Z'], facelets.perm_from_matrix(cube.ROT_XY_CW))
+
+    def test_canonicalize_rotated_and_recolored(self):
+        key, _ = canonicalize(self.scrambled)
+        c = Cube(self.scrambled)
+        c.sequence("X Y Y Zi")
+        self.assertEqual(key, canonicalize(c)[0])
+        recolored = self.scrambled.translate(str.maketrans("ULFRBD", "135246"))
+        self.assertEqual(key, canonicalize(recolored)[0])
+        mirrored = facelets.apply(facelets.to_state(self.scrambled),
+                                  facelets.perm_from_matrix(facelets.SYMMETRY_MATRICES[-1]))
+        self.assertEqual(key, canonicalize(mirrored)[0])
+        self.assertNotEqual(canonicalize(self.scrambled, mirrors=False)[0],
+                            canonicalize(mirrored, mirrors=False)[0])
+
+    def test_canonical_solution_maps_back(self):
+        c = Cube(self.scrambled)
+        c.sequence("X Xi Z")
+        key, transform = canonicalize(c)
+        solver = Solver(Cube(key))
+        solver.solve()
+        c.sequence(" ".join(transform.to_original(solver.moves)))
+        self.assertTrue(c.is_solved())
+
+
+class TestShortDistance(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.table = ShortDistanceTable(depth=3)
+
+    def test_table_sizes(self):
+        self.assertEqual(1 + 12 + 114 + 1068, len(self.table))
+
+    def test_lookup(self):
+        c = Cube(solved_cube_str)
+        c.sequence("R U Fi")
+        self.assertEqual(3, self.table.distance(c))
+        self.assertEqual(['F', 'Ui', 'Ri'], self.table.lookup(c))
+        c.sequence("D")
+        self.assertIsNone(self.table.lookup(c))
+
+    def test_bidirectional_search(self):
+        c = Cube(solved_cube_str)
+        c.sequence("Y R U Fi D Li B")
+        moves = self.table.solve(c)
+        self.assertEqual(6, len(moves))
+        c.sequence(" ".join(moves))
+        self.assertTrue(c.is_solved())
+        c.sequence("R U Fi D Li B L")
+        self.assertIsNone(self.table.solve(c, max_depth=6))
+
+    def test_solver_uses_table(self):
+        c = Cube(solved_cube_str)
+        c.sequence("R U Fi D")
+        solver = Solver(c, short_table=self.table)
+        solver.solve()
+        self.assertTrue(c.is_solved())
+        self.assertEqual(['Di', 'F', 'Ui', 'Ri'], solver.moves)
+
+    def test_solver_falls_back_beyond_forward_depth(self):
+        c = Cube(solved_cube_str)
+        c.sequence("R U Fi D Li")
+        self.assertEqual(5, len(self.table.solve(c)))
+        solver = Solver(c, short_table=self.table)
+        solver.solve()
+        self.assertTrue(c.is_solved())
+        self.assertNotEqual(5, len(solver.moves))
+
+
+class TestBatch(unittest.TestCase):
+
+    cubes = TestSolver.cubes[:3] + TestSolver.unsolvable_cubes[1:2] + [Cube(TestSolver.cubes[3])]
+
+    def _check_results(self, results):
+        self.assertEqual(list(range(len(self.cubes))), [r.index for r in results])
+        for r in results:
+            if r.index == 3:
+                self.assertIsNone(r.moves)
+                self.assertIn("Stuck in loop", r.error)
+                continue
+            self.assertIsNone(r.error)
+            c = Cube(r.cube)
+            c.sequence(" ".join(r.opt_moves))
+            self.assertTrue(c.is_solved())
+
+    def test_solve_many_in_process(self):
+        self._check_results(list(solve_many(self.cubes, workers=1)))
+
+    def test_solve_many_pool(self):
+        self._check_results(list(solve_many(self.cubes, workers=2, chunksize=2)))
+        results = solve_many(self.cubes, workers=2, chunksize=1, ordered=False)
+        self._check_results(sorted(results, key=lambda r: r.index))
+
+
+class TestSolveServer(unittest.TestCase):
+
+    async def _session(self, lines):
+        server = SolveServer(workers=1, batch_size=4)
+        host, port = await server.start_tcp()
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write("".join(line + "\n" for line in lines).encode())
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in lines]
+            writer.close()
+            return responses
+        finally:
+            await server.close()
+
+    def test_requests(self):
+        lines = [json.dumps({'cmd': 'health'}),
+                 "not json",
+                 json.dumps({'id': 1, 'cube': TestSolver.cubes[0]}),
+                 json.dumps({'id': 2, 'cube': TestSolver.unsolvable_cubes[1]}),
+                 json.dumps({'id': 3, 'cube': TestSolver.cubes[1], 'optimize': False})]
+        responses = asyncio.run(self._session(lines))
+        self.assertEqual({'status': 'ok'}, responses[0])
+        self.assertIn("invalid request", responses[1]['error'])
+        by_id = {r['id']: r for r in responses[2:]}
+        self.assertIn("Stuck in loop", by_id[2]['error'])
+        self.assertIsNone(by_id[3]['opt_moves'])
+        for i, cube_str in ((1, TestSolver.cubes[0]), (3, TestSolver.cubes[1])):
+            c = Cube(cube_str)
+            c.sequence(" ".join(by_id[i]['moves']))
+            self.assertTrue(c.is_solved())
+
+    def test_stats(self):
+        responses = asyncio.run(self._session([json.dumps({'cmd': 'stats'})]))
+        self.assertEqual(0, responses[0]['requests'])
+        self.assertEqual(0, responses[0]['queued'])
+
+
+class TestPortfolio(unittest.TestCase):
+
+    def _check_portfolio(self, orig, **kwargs):
+        solver = Solver(Cube(orig))
+        solver.solve()
+        result = solve_portfolio(orig, **kwargs)
+        self.assertLessEqual(len(result.moves), len(optimize_moves(solver.moves)))
+        c = Cube(orig)
+        c.sequence(" ".join(result.moves))
+        self.assertTrue(c.is_solved())
+        return result
+
+    def test_portfolio_in_process(self):
+        self._check_portfolio(TestSolver.cubes[0], workers=1, include_inverse=False)
+
+    def test_portfolio_pool(self):
+        self._check_portfolio(TestSolver.cubes[1], workers=2)
+
+    def test_portfolio_unsolvable(self):
+        self.assertRaisesRegex(Exception, "unsolvable cube", solve_portfolio,
+                               TestSolver.unsolvable_cubes[1], workers=1, include_inverse=False)
+
+
+class TestNotation(unittest.TestCase):
+
+    def test_parse_moves(self):
+        self.assertEqual(['R', 'U', 'U', 'Fi', 'Ri', 'M', 'L', 'M', 'Xi', 'B', 'Si', 'B', 'Si'],
+                         parse_moves("R U2 F' r' l x' Bw2"))
+        self.assertEqual(['R', 'R'], parse_moves("R2'"))
+        self.assertRaises(ValueError, parse_moves, "Mw")
+        self.assertRaises(ValueError, parse_moves, "Q")
+
+    def test_wide_moves(self):
+        for wide, equivalent in (("r", "L X"), ("l", "R Xi"), ("u", "D Y"),
+                                 ("d", "U Yi"), ("f", "B Z"), ("b", "F Zi")):
+            self.assertEqual(facelets.sequence_perm(equivalent), facelets.sequence_perm(wide))
+
+    def test_cube_sequence_extended_notation(self):
+        c, d = Cube(debug_cube_str), Cube(debug_cube_str)
+        c.sequence("R2 U' r y")
+        d.sequence("R R Ui R Mi Y")
+        self.assertEqual(c, d)
+
+    def test_format_moves(self):
+        moves = ['R', 'R', 'U', 'Ui', 'Ui', 'M', 'F', 'F', 'F', 'Fi']
+        self.assertEqual(['R2', "U'", 'M', 'F2'], format_moves(moves))
+        self.assertEqual(['R', 'R', 'Ui', 'M', 'F', 'F'], format_moves(moves, half_turns=False, prime=False))
+        expanded = format_moves(['M', 'Ei'], expand_slices=True)
+        self.assertEqual(['R', "L'", "X'", "U'", 'D', 'Y'], expanded)
+        self.assertEqual(facelets.sequence_perm("M Ei"), facelets.sequence_perm(" ".join(expanded)))
+
+    def test_count_moves(self):
+        self.assertEqual({'htm': 4, 'qtm': 5, 'stm': 3}, count_moves(['R', 'R', 'M', 'X', 'Ui']))
+        self.assertEqual({'htm': 3, 'qtm': 6, 'stm': 2}, count_moves(['R2', "M2'"]))
+        self.assertEqual({'htm': 0, 'qtm': 0, 'stm': 0}, count_moves(['R', 'Ri', 'X']))
+
+
+class TestVerify(unittest.TestCase):
+
+    def test_sequences_equivalent(self):
+        self.assertTrue(sequences_equivalent("R L Ri", "L"))
+        self.assertTrue(sequences_equivalent(['R', 'R', 'R'], ['Ri']))
+        self.assertFalse(sequences_equivalent("R U", "U R"))
+        self.assertTrue(sequences_equivalent("X U", "F"))
+        self.assertFalse(sequences_equivalent("X U", "F", up_to_rotation=False))
+        self.assertRaises(ValueError, sequences_equivalent, "R", "Q")
+
+    def test_verify_many(self):
+        c = Cube(TestSolver.cubes[4])
+        solver = Solver(c)
+        solver.solve()
+        opt = optimize_moves(solver.moves)
+        self.assertEqual([True, False], verify_many([(solver.moves, opt), (solver.moves, opt[1:])]))
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_percentile(self):
+        self.assertEqual(2.5, percentile([4, 1, 3, 2], 50))
+        self.assertEqual(4, percentile([4, 1, 3, 2], 100))
+        self.assertEqual(7, percentile([7], 90))
+
+    def test_compare(self):
+        baseline = {'a': {'median': 100.0}, 'b': {'median': 100.0}}
+        results = {'a': {'median': 80.0}, 'b': {'median': 70.0}, 'c': {'median': 1.0}}
+        regressions = compare(results, baseline, 0.25)
+        self.assertEqual(1, len(regressions))
+        self.assertTrue(regressions[0].startswith('b:'))
+        # a threshold recorded in the baseline is used unless one is given
+        baseline['b']['threshold'] = 0.4
+        self.assertEqual([], compare(results, baseline))
+        self.assertEqual(1, len(compare(results, baseline, 0.25)))
+        self.assertEqual(1, len(compare(results, {'b': {'median': 100.0}})))
+        self.assertEqual(0.25, baseline_threshold({'slowest_round': 95.0, 'median': 100.0}))
+        self.assertEqual(0.3, baseline_threshold({'slowest_round': 85.0, 'median': 100.0}))
+        self.assertEqual(0.4, baseline_threshold({'slowest_round': 50.0, 'median': 100.0}))
+
+    def test_run_benchmark(self):
+        stats = run_benchmark('cube_moves', samples=2, min_time=0.01)
+        self.assertEqual(2, stats['samples'])
+        self.assertGreaterEqual(stats['repeats'], 1)
+        self.assertTrue(0 < stats['min'] <= stats['median'] <= stats['max'])
+        stats = run_benchmarks(['cube_moves', 'find_piece'], samples=2, min_time=0.01, rounds=2)
+        self.assertEqual(4, stats['find_piece']['samples'])
+        self.assertLessEqual(stats['cube_moves']['slowest_round'], stats['cube_moves']['max'])
+
+
+class TestRandomRunner(unittest.TestCase):
+
+    def test_seeded_cubes(self):
+        a = random_cube_solver.random_cube_model(random_cube_solver.cube_rng(5, 3))
+        b = random_cube_solver.random_cube_model(random_cube_solver.cube_rng(5, 3))
+        c = random_cube_solver.random_cube_model(random_cube_solver.cube_rng(5, 4))
+        self.assertEqual(a.flat_str(), b.flat_str())
+        self.assertNotEqual(a.flat_str(), c.flat_str())
+
+    def test_workers_merge_exactly(self):
+        serial = list(random_cube_solver._results(11, 0, 6, 1))
+        parallel = list(random_cube_solver._results(11, 0, 6, 2))
+        key = lambda r: (r['index'], r['cube'], r['solved'], r['moves'], r['opt_moves'])
+        self.assertEqual([key(r) for r in serial], [key(r) for r in parallel])
+
+        stats = random_cube_solver.new_stats()
+        for result in parallel:
+            random_cube_solver.add_result(stats, result)
+        summary = random_cube_solver.summary(stats)
+        self.assertEqual(6, summary['total'])
+        self.assertEqual(sum(r['moves'] for r in serial) / 6, summary['avg_moves'])
+        self.assertEqual(key(serial[4]), key(random_cube_solver.solve_index(11, 4)))
+
+    def test_records_and_resume(self):
+        with tempfile.TemporaryDirectory() as d, contextlib.redirect_stdout(None):
+            records = os.path.join(d, "records.jsonl")
+            checkpoint = os.path.join(d, "checkpoint.json")
+            random_cube_solver.run(3, os.path.join(d, "stats.txt"), seed=3,
+                                   records_file=records, checkpoint_file=checkpoint)
+            self.assertEqual(3, random_cube_solver.load_checkpoint(checkpoint)["next_index"])
+            with open(records, "a") as f:
+                f.write('{"index": "written after the checkpoint"}\n')
+            resumed = random_cube_solver.run(5, os.path.join(d, "stats.txt"), records_file=records,
+                                             checkpoint_file=checkpoint, resume=True)
+            fresh = random_cube_solver.run(5, os.path.join(d, "stats.txt"), seed=3)
+            with open(records) as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual([0, 1, 2, 3, 4], [r['index'] for r in lines])
+        self.assertEqual('solved', lines[0]['status'])
+        self.assertIn('cross', lines[0]['phase_times'])
+        self.assertEqual(fresh['total'], resumed['total'])
+        self.assertEqual(fresh['avg_moves'], resumed['avg_moves'])
+        self.assertEqual(fresh['moves'], resumed['moves'])
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        h = Histogram()
+        for v in range(1, 1001):
+            h.record(v)
+        summary = h.summary()
+        self.assertEqual(1000, summary['count'])
+        self.assertEqual(500.5, summary['mean'])
+        self.assertEqual(1000, summary['max'])
+        for p, expected in ((50, 500), (90, 900), (99, 990), (99.9, 999)):
+            self.assertAlmostEqual(expected, summary[f'p{p:g}'], delta=expected / 100)
+        self.assertEqual(0.0, Histogram().percentile(99))
+        self.assertRaises(ValueError, h.record, -1)
+
+    def test_scale(self):
+        h = Histogram(1e6)
+        h.record(0.25)
+        h.record(0.001, 3)
+        self.assertEqual(4, h.count)
+        self.assertAlmostEqual(0.001, h.percentile(50), delta=1e-5)
+        self.assertEqual(0.25, h.percentile(100))
+
+    def test_merge(self):
+        a, b, both = Histogram(), Histogram(), Histogram()
+        for v in range(0, 5000, 7):
+            (a if v % 2 else b).record(v)
+            both.record(v)
+        self.assertEqual(both.summary(), a.merge(b).summary())
+        self.assertEqual(both.counts, Histogram.from_dict(json.loads(json.dumps(both.to_dict()))).counts)
+        self.assertRaises(ValueError, a.merge, Histogram(1e6))
+
+
+class TestProfiling(unittest.TestCase):
+
+    def test_profile_solves(self):
+        build_tables()
+        with profile_solves(interval=0.001, snapshot_every=20) as profile:
+            Solver(Cube(TestSolver.cubes[0])).solve()
+        rows = {row[0]: row for row in profile.focus_table()}
+        self.assertEqual(set(FOCUS), set(rows))
+        self.assertIn('Solver.last_layer_edges', rows)
+        self.assertIn('Solver.second_layer', rows)
+        self.assertGreater(rows['Solver.first_two_layers'][3], 0)
+        self.assertGreater(rows['pair_table.solve_pairs'][1], 0)
+        self.assertGreater(rows['Piece.rotate'][1], 0)
+        self.assertGreater(rows['Solver.cross'][3], 0)
+        self.assertGreater(profile.samples, 0)
+        self.assertIn('Piece.rotate', profile.report(5))
+
+        with tempfile.TemporaryDirectory() as d:
+            paths = profile.save(d)
+            self.assertEqual(3, len(paths))
+            with open(os.path.join(d, 'time.collapsed')) as f:
+                stack, count = f.readline().rsplit(' ', 1)
+        self.assertIn(';', stack)
+        self.assertGreater(int(count), 0)
+
+
+class TestNxNCube(unittest.TestCase):
+
+    def test_3x3_matches_cube(self):
+        for move in facelets.MOVES:
+            self.assertEqual(facelets.MOVE_PERMS[move], bytes(move_perm(3, move)), move)
+        c = Cube(debug_cube_str)
+        n = NxNCube(3, debug_cube_str)
+        c.sequence("R U2 Mi F' x D")
+        n.sequence("R U2 Mi F' x D")
+        self.assertEqual(c.flat_str(), n.flat_str())
+        self.assertEqual(str(Cube(solved_cube_str)), str(NxNCube(3)))
+
+    def test_moves(self):
+        c = NxNCube(4)
+        c.sequence("R U Ri Ui " * 6)
+        self.assertTrue(c.is_solved())
+        c.sequence("2R")
+        self.assertFalse(c.is_solved())
+        self.assertEqual(('R',) * 16, c.face('R'))
+        self.assertEqual(('F', 'F', 'D', 'F'), c.face('F')[:4])
+        c.sequence("2R'")
+        self.assertTrue(c.is_solved())
+
+        a, b = NxNCube(5), NxNCube(5)
+        a.sequence("3Rw' r")
+        b.sequence("3Ri")
+        self.assertEqual(a, b)
+        a.sequence("M2 x")
+        b.sequence("L2 3L2 R2 L2 R2 x")
+        self.assertEqual(a, b)
+        self.assertRaises(ValueError, NxNCube(4).sequence, "M")
+        self.assertRaises(ValueError, NxNCube(4).sequence, "5R")
+        self.assertRaises(ValueError, NxNCube, 4, "UUU")
+
+    def test_string_io(self):
+        c = NxNCube(6)
+        c.sequence("3Uw 2F' L2 Dw")
+        self.assertEqual(c, NxNCube(6, str(c)))
+        self.assertEqual(216, len(c.flat_str()))
+
+
+class TestAlgorithm(unittest.TestCase):
+
+    def test_order(self):
+        self.assertEqual(4, Algorithm("R").order())
+        self.assertEqual(6, Algorithm("R U Ri Ui").order())
+        self.assertEqual(105, Algorithm("R U").order())
+        self.assertEqual(1, Algorithm("").order())
+        self.assertTrue(Algorithm("R U").power(105).is_identity())
+
+    def test_inverse_and_power(self):
+        a = Algorithm("R U' F2 M")
+        self.assertTrue((a * a.inverse()).is_identity())
+        self.assertEqual(['Mi', 'Fi', 'Fi', 'U', 'Ri'], a.inverse().moves)
+        self.assertTrue(a.power(5).same_effect(a * a * a * a * a))
+        self.assertTrue(a.power(-2).same_effect(a.inverse() * a.inverse()))
+        big = Algorithm("R U").power(10 ** 18)
+        self.assertTrue(big.same_effect(Algorithm("R U").power(10 ** 18 % 105)))
+        self.assertEqual(2 * (10 ** 18 % 105), len(big))
+
+        c = Cube(solved_cube_str)
+        c.sequence(str(a ** 3))
+        self.assertEqual(facelets.apply(facelets.SOLVED, a.power(3).perm).decode(), c.flat_str())
+
+    def test_commutator_and_conjugate(self):
+        self.assertTrue(commutator("R", "U").same_effect(Algorithm("R U Ri Ui")))
+        self.assertTrue(conjugate("F", "R U").same_effect(Algorithm("F R U Fi")))
+        self.assertEqual(["F", "R", "U", "Fi"], conjugate(Algorithm("F"), "R U").moves)
+
+    def test_cycle_structure(self):
+        self.assertEqual([PieceCycle(('UL', 'UR', 'UF'), 1)],
+                         Algorithm("R2 U R U R' U' R' U' R' U R'").cycle_structure())
+        self.assertEqual([PieceCycle(('UB', 'UF'), 1), PieceCycle(('UL', 'UR'), 1)],
+                         Algorithm("M2 U M2 U2 M2 U M2").cycle_structure())
+        self.assertEqual([PieceCycle(('UB',), 2), PieceCycle(('UF',), 2)],
+                         Algorithm("M' U M' U M' U M' U2 M' U M' U M' U M'").cycle_structure())
+        self.assertIn(PieceCycle(('UFR',), 3), Algorithm("R' D' R D R' D' R D").cycle_structure())
+        self.assertEqual("3-cycle UL -> UR -> UF", Algorithm("R2 U R U R' U' R' U' R' U R'").describe())
+        self.assertEqual("identity", Algorithm("R Ri").describe())
+
+
+class TestCubeState(unittest.TestCase):
+
+    def test_moves_match_cube(self):
+        c = Cube(debug_cube_str)
+        state = CubeState(c)
+        c.sequence("R U2 M' x D")
+        self.assertEqual(c.flat_str(), state.apply("R").apply("U2").apply("M'").apply("x").apply("D").flat_str())
+        self.assertEqual(c.flat_str(), state.apply_seq("R U2 M' x D").flat_str())
+        self.assertEqual(c.flat_str(), state.apply_seq(['R', 'U', 'U', 'Mi', 'X', 'D']).flat_str())
+        self.assertEqual(c.flat_str(), state.apply_seq(['R', 'U2', "M'", 'x', 'D']).flat_str())
+        self.assertEqual(Cube(debug_cube_str), state.to_cube())
+        self.assertEqual(state, CubeState.from_cube(Cube(debug_cube_str)))
+
+    def test_immutable_and_hashable(self):
+        a = CubeState()
+        b = a.apply("R")
+        self.assertTrue(a.is_solved())
+        self.assertFalse(b.is_solved())
+        self.assertRaises(AttributeError, setattr, a, '_state', b.state)
+        self.assertEqual({a: 0, b: 1}[CubeState().apply_seq("R")], 1)
+        self.assertEqual(a, b.apply("Ri"))
+        self.assertNotEqual(a, b)
+
+    def test_pickle(self):
+        state = CubeState(solved_cube_str).apply_seq("R U F")
+        data = pickle.dumps(state)
+        self.assertLess(len(data), 150)
+        self.assertEqual(state, pickle.loads(data))
+
+
+class TestSearch(unittest.TestCase):
+
+    def test_canonical_pruning(self):
+        successors = Search()._successors
+        self.assertEqual(18, len(successors[None]))
+        # as many canonical two move sequences as states at distance 2
+        self.assertEqual(243, sum(len(successors[face]) for _, face, _ in successors[None]))
+        self.assertNotIn('U', [name[0] for name, _, _ in successors['D']])
+        self.assertIn('D', [name[0] for name, _, _ in successors['U']])
+
+    def test_ida_star_and_a_star(self):
+        start = CubeState().apply_seq("R U2 Fi")
+        search = Search()
+        self.assertEqual(['F', 'U', 'U', 'Ri'], search.ida_star(start))
+        self.assertGreater(search.nodes, 0)
+        self.assertGreater(search.nodes_per_second(), 0)
+        self.assertEqual(['F', 'U', 'U', 'Ri'], search.a_star(start))
+        self.assertTrue(facelets.is_solved(facelets.apply(start.state, facelets.sequence_perm(search.a_star(start)))))
+        self.assertEqual([], search.ida_star(CubeState()))
+        self.assertIsNone(search.ida_star(start, max_depth=2))
+        self.assertIsNone(search.a_star(start, max_nodes=10))
+
+    def test_pluggable_goal_and_heuristic(self):
+        up = facelets.FACES['U']
+        search = Search(is_goal=lambda state: all(state[i] == ord('U') for i in up))
+        self.assertEqual(['Li', 'R', 'R'], search.ida_star(CubeState().apply_seq("L R2")))
+        self.assertEqual(['Di', 'Li', 'R', 'R'], search.ida_star(CubeState().apply_seq("L R2 D")))
+
+        table = ShortDistanceTable(3)
+        scramble = "R U2 Fi L D B2"
+        search = Search(heuristic=distance_table_heuristic(table))
+        moves = search.ida_star(CubeState().apply_seq(scramble))
+        self.assertEqual(6, count_moves(moves)['htm'])
+        self.assertTrue(CubeState().apply_seq(scramble).apply_seq(" ".join(moves)).is_solved())
+
+
+class TestCrossTable(unittest.TestCase):
+
+    def test_distance_distribution(self):
+        counts = [0] * 9
+        for d in cross_table.table().distances:
+            if d != 255:
+                counts[d] += 1
+        self.assertEqual([1, 15, 158, 1394, 9809, 46381, 97254, 34966, 102], counts)
+        self.assertEqual(190080, len(cross_table.table()))
+
+    def test_solve_cross(self):
+        state = facelets.apply(facelets.SOLVED, facelets.sequence_perm("F R2 U' L D2 B M"))
+        moves = cross_table.solve_cross(state)
+        solved = facelets.apply(state, facelets.sequence_perm(moves))
+        self.assertEqual(0, cross_table.cross_distance(solved))
+        self.assertEqual([], cross_table.solve_cross(facelets.SOLVED))
+        self.assertEqual(['R', 'R', 'Fi'], cross_table.solve_cross(facelets.apply(facelets.SOLVED, facelets.sequence_perm("F R2"))))
+
+    def test_solver_cross_is_optimal(self):
+        for cube_str in TestSolver.cubes:
+            state = facelets.relabel(facelets.to_state(cube_str))[0]
+            solver = Solver(Cube(cube_str))
+            solver.cross()
+            self.assertEqual(0, cross_table.cross_distance(facelets.relabel(facelets.to_state(solver.cube))[0]))
+            self.assertEqual(cross_table.cross_distance(state), count_moves(solver.moves)['htm'])
+
+
+class TestPairTable(unittest.TestCase):
+
+    def test_macros_keep_cross(self):
+        for turns, _, perm in pair_table.MACROS:
+            self.assertEqual(0, cross_table.cross_distance(facelets.apply(facelets.SOLVED, perm)), turns)
+
+    def test_every_pair_reachable(self):
+        # any corner sticker, any edge sticker outside the cross
+        for slot in pair_table.SLOTS:
+            self.assertEqual(24 * (24 - 8), len(pair_table.table(slot, ())))
+
+    def test_solve_pairs(self):
+        self.assertEqual([], pair_table.solve_pairs(facelets.SOLVED))
+        state = facelets.apply(facelets.SOLVED, facelets.sequence_perm("L B Li U Bi Ui"))
+        self.assertEqual(['U', 'B', 'Ui', 'L', 'Bi', 'Li'], pair_table.solve_pairs(state))
+        state = facelets.apply(facelets.SOLVED, facelets.sequence_perm("F R2 U' L D2 B M R U2"))
+        state = facelets.apply(state, facelets.sequence_perm(cross_table.solve_cross(state)))
+        solved = facelets.apply(state, facelets.sequence_perm(pair_table.solve_pairs(state)))
+        # nothing left to do: every pair is in its slot
+        self.assertEqual([], pair_table.solve_pairs(solved))
+        self.assertEqual(0, cross_table.cross_distance(solved))
+
+    def test_solver_first_two_layers(self):
+        for cube_str in TestSolver.cubes:
+            solver = Solver(Cube(cube_str))
+            solver.cross()
+            solver.first_two_layers()
+            state = facelets.relabel(facelets.to_state(solver.cube))[0]
+            self.assertEqual([], pair_table.solve_pairs(state))
+            self.assertEqual(0, cross_table.cross_distance(state))
+
+
+class TestFramedCube(unittest.TestCase):
+    moves = "L Ri X U M Yi Di F Z S Bi Ei X R Zi M"
+
+    def test_frames(self):
+        self.assertEqual(24, len(FRAMES))
+
+    def test_matches_cube(self):
+        c = Cube(TestSolver.cubes[0])
+        framed = FramedCube(Cube(TestSolver.cubes[0]))
+        for move in self.moves.split():
+            c.sequence(move)
+            performed = framed.sequence(move)
+            self.assertEqual(move[0] in 'XYZ', performed == [])
+            self.assertEqual(c.flat_str(), framed.flat_str())
+            self.assertEqual(c.front_color(), framed.front_color())
+            for piece in c.pieces:
+                self.assertEqual(piece.colors, framed[piece.pos].colors)
+                self.assertEqual(piece.pos, framed[piece.pos].pos)
+
+    def test_materialize(self):
+        c = Cube(TestSolver.cubes[1])
+        c.sequence(self.moves)
+        framed = FramedCube(Cube(TestSolver.cubes[1]))
+        framed.sequence(self.moves)
+        self.assertNotEqual(c, framed.cube)
+        framed.materialize()
+        self.assertEqual(c, framed.cube)
+
+    def test_solver_modes(self):
+        for cube_str in TestSolver.cubes:
+            physical, virtual, unrecorded = Cube(cube_str), Cube(cube_str), Cube(cube_str)
+            solver = Solver(physical)
+            solver.solve()
+            framed_solver = Solver(virtual, virtual_rotations=True)
+            framed_solver.solve()
+            self.assertEqual(solver.moves, framed_solver.moves)
+            self.assertEqual(physical, virtual)
+
+            no_rotations = Solver(unrecorded, virtual_rotations=True, record_rotations=False)
+            no_rotations.solve()
+            self.assertFalse(any(move[0] in 'XYZ' for move in no_rotations.moves))
+            state = facelets.apply(facelets.to_state(cube_str), facelets.sequence_perm(no_rotations.moves))
+            self.assertEqual(facelets.to_state(unrecorded), state)
+            self.assertTrue(facelets.is_solved(state))
+
+    def test_record_rotations_needs_virtual(self):
+        with self.assertRaises(ValueError):
+            Solver(Cube(TestSolver.cubes[0]), record_rotations=False)
+
+
+@unittest.skipUnless(explore.np is not None, "explore requires numpy")
+class TestExplore(unittest.TestCase):
+
+    def test_distance_distribution(self):
+        self.assertEqual([1, 18, 243, 3240, 43239], explore.distance_distribution(4))
+        self.assertEqual([1, 12, 114, 1068], explore.distance_distribution(3, metric='qtm'))
+        self.assertEqual([1, 4, 6, 4, 1], explore.distance_distribution(10, metric='qtm', faces='RL'))
+
+    def test_matches_state_bfs(self):
+        moves = explore.move_set('htm', 'RUF')
+        seen = {facelets.SOLVED}
+        frontier = [facelets.SOLVED]
+        counts = [1]
+        for _ in range(3):
+            frontier = [s for s in {facelets.apply(state, perm) for state in frontier for perm in moves.values()}
+                        if s not in seen]
+            seen.update(frontier)
+            counts.append(len(frontier))
+        self.assertEqual(counts, explore.distance_distribution(3, faces='RUF'))
+
+    def test_frontier_files(self):
+        with tempfile.TemporaryDirectory() as d:
+            counts = explore.Explorer(out_dir=d, mmap_threshold=100).run(2)
+            keys = explore.np.load(os.path.join(d, 'depth_02.npy'))
+            self.assertEqual(counts[2], len(keys))
+            state = facelets.apply(facelets.SOLVED, facelets.sequence_perm("R U"))
+            self.assertIn(explore.state_key(state), {tuple(int(k) for k in key) for key in keys})
+
+    def test_spilled_runs(self):
+        # many small runs and memory-mapped frontiers give the same counts and keys
+        with tempfile.TemporaryDirectory() as d:
+            explorer = explore.Explorer(out_dir=d, chunk_size=100, mmap_threshold=50)
+            self.assertEqual([1, 18, 243, 3240], explorer.run(3))
+            self.assertEqual(['depth_00.npy', 'depth_01.npy', 'depth_02.npy', 'depth_03.npy'], sorted(os.listdir(d)))
+            keys = explore.np.load(os.path.join(d, 'depth_03.npy'))
+            self.assertTrue((keys == explore._unique(keys)).all())
+            self.assertTrue((explorer.expand(keys[:10]) == explore.Explorer().expand(keys[:10])).all())
+
 
 if __name__ == '__main__':
     unittest.main()